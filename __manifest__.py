@@ -10,6 +10,8 @@
     ],
     "data": [
         "security/ir.model.access.csv",
+        "data/ir_config_parameter_data.xml",
+        "data/ir_cron_data.xml",
         "views/api_test_views.xml",
         "views/erp_security_views.xml",
         "views/webhook_config_views.xml",
@@ -26,6 +28,6 @@
     "application": True,
     "auto_install": False,
     "external_dependencies": {
-        "python": ["requests", "PyJWT"],
+        "python": ["requests", "PyJWT", "cryptography"],
     },
 }
@@ -6,8 +6,20 @@ from ..utils.helpers import (
     get_employee,
     prepare_ilogdata,
 )
+from ..utils.upstream import (
+    UPSTREAM_CACHE_NEGATIVE_TTL,
+    UpstreamTimeout,
+    fetch_concurrently,
+    upstream_cache,
+)
+from ..utils import http_client
+from ..utils.log_sink import submit_ilog
+from ..utils.jwks import JWKSCache, UnknownKeyError, verify_token
+import hashlib
+import jwt
+import logging
+import math
 import os
-import requests
 
 auth = "public"
 
@@ -16,22 +28,125 @@ KEYCLOAK_URL = os.getenv("KEYCLOAK_URL")
 ESS_APIKEY = os.getenv("ESS_APIKEY")
 KEYCLOAK_TENANT_ID = os.getenv("KEYCLOAK_TENANT_ID")
 GET_USER_INFO_URL = os.getenv("GET_USER_INFO_URL")
+# "remote" posts every access token to KEYCLOAK_URL, "jwks" verifies it locally
+KEYCLOAK_VALIDATION_MODE = os.getenv("KEYCLOAK_VALIDATION_MODE", "remote")
+KEYCLOAK_JWKS_URL = os.getenv("KEYCLOAK_JWKS_URL")
+KEYCLOAK_JWKS_FILE = os.getenv("KEYCLOAK_JWKS_FILE")
+KEYCLOAK_JWKS_TTL = int(os.getenv("KEYCLOAK_JWKS_TTL", "3600"))
+KEYCLOAK_ISSUER = os.getenv("KEYCLOAK_ISSUER")
+KEYCLOAK_AUDIENCE = os.getenv("KEYCLOAK_AUDIENCE")
+
+_logger = logging.getLogger(__name__)
+
+keycloak_jwks = JWKSCache(
+    url=KEYCLOAK_JWKS_URL, path=KEYCLOAK_JWKS_FILE, ttl=KEYCLOAK_JWKS_TTL
+)
+# A signature alone does not say the token was issued for this API
+KEYCLOAK_JWKS_ENABLED = KEYCLOAK_VALIDATION_MODE == "jwks" and bool(
+    KEYCLOAK_ISSUER and KEYCLOAK_AUDIENCE
+)
+if KEYCLOAK_VALIDATION_MODE == "jwks" and not KEYCLOAK_JWKS_ENABLED:
+    _logger.error(
+        "KEYCLOAK_VALIDATION_MODE=jwks needs KEYCLOAK_ISSUER and "
+        "KEYCLOAK_AUDIENCE; access tokens are validated remotely instead"
+    )
+
+JWKS_MAX_AGE = int(os.getenv("ERP_JWKS_MAX_AGE", "300"))
+BULK_TOKEN_MAX_SESSIONS = int(os.getenv("BULK_TOKEN_MAX_SESSIONS", "500"))
+
+# Marker cached for access tokens rejected upstream with a 401
+_INVALID_TOKEN = "invalid_token"
+
+
+def _access_token_expiry(authorization, payload=None):
+    """Return the ``exp`` epoch of the access token, if it can be read."""
+    if isinstance(payload, dict) and payload.get("exp"):
+        return payload["exp"]
+    token = authorization
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    try:
+        return jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.InvalidTokenError:
+        return None
 
 
 class AppSecurityController(http.Controller):
-    def _get_jwt_payload(self, authorization):
+    def _verify_jwt_locally(self, authorization):
+        """Verify the Keycloak access token against the realm JWKS.
+
+        Returns the token claims, an error response, or None when the token
+        is signed with an unknown key and the remote introspection must decide.
+        """
+        token = authorization
+        if authorization.lower().startswith("bearer "):
+            token = authorization[7:]
+        try:
+            return verify_token(
+                token,
+                keycloak_jwks,
+                issuer=KEYCLOAK_ISSUER,
+                audience=KEYCLOAK_AUDIENCE,
+            )
+        except UnknownKeyError as e:
+            _logger.info("Unknown Keycloak key id %s, using introspection", e)
+            return None
+        except jwt.ExpiredSignatureError:
+            return json_Response({"error": "Access token has expired"}, 401)
+        except jwt.InvalidTokenError:
+            return json_Response({"error": "Invalid access token"}, 401)
+
+    def _cached_upstream(self, kind, authorization, fetch):
+        """Return ``fetch()`` through the upstream cache.
+
+        Entries are keyed by a digest of the Authorization header and never
+        outlive the access token; 401 replies are cached for a few seconds.
+        """
+        digest = hashlib.sha256(authorization.encode()).hexdigest()
+        key = (kind, digest)
+        cached = upstream_cache.get(key)
+        if cached == _INVALID_TOKEN:
+            return json_Response({"error": "Invalid access token"}, 401)
+        if cached is not None:
+            return cached
+
+        result = fetch()
+        if isinstance(result, http.Response):
+            if result.status_code == 401:
+                upstream_cache.set(key, _INVALID_TOKEN, ttl=UPSTREAM_CACHE_NEGATIVE_TTL)
+            return result
+
+        expires_at = _access_token_expiry(authorization, result)
+        if expires_at is not None:
+            # Opaque tokens have no known expiry and are never cached
+            upstream_cache.set(key, result, expires_at=expires_at)
+        return result
+
+    def _get_jwt_payload(self, authorization, timeout=10):
         if not authorization:
             return json_Response({"error": "payload Missing Authorization header"}, 401)
 
+        return self._cached_upstream(
+            "introspection",
+            authorization,
+            lambda: self._fetch_jwt_payload(authorization, timeout),
+        )
+
+    def _fetch_jwt_payload(self, authorization, timeout):
+        if KEYCLOAK_JWKS_ENABLED:
+            payload = self._verify_jwt_locally(authorization)
+            if payload is not None:
+                return payload
+
         try:
-            resp = requests.post(
+            resp = http_client.post(
                 f"{KEYCLOAK_URL}",
                 params={
                     "tenant_id": KEYCLOAK_TENANT_ID,
                     "apikey": ESS_APIKEY,
                 },
                 headers={"Authorization": authorization},
-                timeout=10,
+                timeout=timeout,
             )
             if not resp.ok:
                 if resp.status_code == 401:
@@ -43,21 +158,28 @@ class AppSecurityController(http.Controller):
         except Exception as e:
             return json_Response({"error": str(e)}, 500)
 
-    def _get_user_info(self, authorization):
+    def _get_user_info(self, authorization, timeout=10):
         if not authorization:
             return json_Response(
                 {"error": "userinfo Missing Authorization header"}, 401
             )
 
+        return self._cached_upstream(
+            "userinfo",
+            authorization,
+            lambda: self._fetch_user_info(authorization, timeout),
+        )
+
+    def _fetch_user_info(self, authorization, timeout):
         try:
-            resp = requests.get(
+            resp = http_client.get(
                 f"{GET_USER_INFO_URL}",
                 params={"apikey": ESS_APIKEY},
                 headers={
                     "Authorization": authorization,
                     "tenant-id": KEYCLOAK_TENANT_ID,
                 },
-                timeout=10,
+                timeout=timeout,
             )
             if not resp.ok:
                 if resp.status_code == 401:
@@ -70,6 +192,19 @@ class AppSecurityController(http.Controller):
         except Exception as e:
             return json_Response({"error": str(e)}, 500)
 
+    def _check_rate_limit(self, checks):
+        """Return a 429 response if any ``(scope, key)`` bucket is empty."""
+        RateLimit = request.env["erp.rate_limit"].sudo()
+        for scope, key in checks:
+            retry_after = RateLimit._consume(scope, key)
+            if retry_after:
+                return json_Response(
+                    {"error": "Too Many Requests"},
+                    429,
+                    headers={"Retry-After": str(math.ceil(retry_after))},
+                )
+        return None
+
     @http.route(
         "/api/erp/jwt2_token",
         type="http",
@@ -78,15 +213,38 @@ class AppSecurityController(http.Controller):
         csrf=False,
     )
     def get_token(self):
+        checks = [("ip", request.httprequest.remote_addr)]
+        authorization = request.httprequest.headers.get("Authorization")
+        if authorization:
+            digest = hashlib.sha256(authorization.encode()).hexdigest()
+            checks.append(("identity", f"token:{digest}"))
+        limited = self._check_rate_limit(checks)
+        if limited:
+            return limited
+
         csi = None
         if auth == "user_restapi":
             csi = validate_api_key()
 
         _logdata = prepare_ilogdata(csi=csi, request=request)
         if auth == "public" or csi:
-            authorization = request.httprequest.headers.get("Authorization")
-            payload_resp = self._get_jwt_payload(authorization)
-            userinfo_resp = self._get_user_info(authorization)
+            try:
+                upstream, _timings = fetch_concurrently(
+                    {
+                        "introspection": lambda timeout: self._get_jwt_payload(
+                            authorization, timeout=timeout
+                        ),
+                        "userinfo": lambda timeout: self._get_user_info(
+                            authorization, timeout=timeout
+                        ),
+                    },
+                    is_failure=lambda resp: isinstance(resp, http.Response),
+                )
+            except UpstreamTimeout as e:
+                return json_Response({"error": str(e)}, 504)
+
+            payload_resp = upstream.get("introspection")
+            userinfo_resp = upstream.get("userinfo")
 
             if isinstance(payload_resp, http.Response):
                 return payload_resp
@@ -101,6 +259,14 @@ class AppSecurityController(http.Controller):
             salis_session_id = payload.get("sid")
             national_id = userinfo.get("poi_num")
 
+            # Same user cycling through fresh access tokens
+            if salis_user_id:
+                limited = self._check_rate_limit(
+                    [("identity", f"sub:{salis_user_id}")]
+                )
+                if limited:
+                    return limited
+
             ErpSecurity = request.env["erp.security"].sudo()
 
             # Check if a valid, non-expired token already exists for this user
@@ -139,18 +305,93 @@ class AppSecurityController(http.Controller):
                 "national_id": national_id,
             }
             try:
+                refresh_token, refresh_vals = ErpSecurity._new_refresh_token()
+                vals.update(refresh_vals)
                 record = ErpSecurity.create(vals)
-                if not record.jwt_token:
-                    record.generate_token()
                 token = record.jwt_token
-                return json_Response({"jwt2_token": token}, 200)
+                return json_Response(
+                    {"jwt2_token": token, "refresh_token": refresh_token}, 200
+                )
             except Exception as e:
                 return json_Response({"error": str(e)}, 500)
         else:
             _logdata["error"] = "Unauthorized Access"
-            request.env["basei.log"].sudo().create(_logdata)
+            submit_ilog(request.env, _logdata)
             return json_Response({"error": "Unauthorized Access"}, 401)
 
+    @http.route(
+        "/api/erp/jwt2_token/bulk",
+        type="http",
+        auth="public",
+        methods=["POST"],
+        csrf=False,
+    )
+    def get_tokens_bulk(self):
+        """Service-to-service issuance of tokens for a list of sessions."""
+        csi = validate_api_key()
+        _logdata = prepare_ilogdata(csi=csi, request=request)
+        if not csi:
+            _logdata["error"] = "Unauthorized Access"
+            submit_ilog(request.env, _logdata)
+            return json_Response({"error": "Unauthorized Access"}, 401)
+
+        data = request.httprequest.get_json(silent=True)
+        sessions = data.get("sessions") if isinstance(data, dict) else None
+        if not isinstance(sessions, list) or not sessions:
+            return json_Response({"error": "Missing sessions"}, 400)
+        if len(sessions) > BULK_TOKEN_MAX_SESSIONS:
+            return json_Response(
+                {"error": f"At most {BULK_TOKEN_MAX_SESSIONS} sessions per request"},
+                400,
+            )
+
+        try:
+            results = request.env["erp.security"].sudo().issue_tokens(sessions)
+            return json_Response({"tokens": results}, 200)
+        except Exception as e:
+            return json_Response({"error": str(e)}, 500)
+
+    @http.route(
+        "/api/erp/token/refresh",
+        type="http",
+        auth="public",
+        methods=["POST"],
+        csrf=False,
+    )
+    def refresh_erp_token(self):
+        data = request.httprequest.get_json(silent=True)
+        if not isinstance(data, dict) or not data.get("refresh_token"):
+            return json_Response({"error": "Missing refresh token"}, 400)
+
+        ErpSecurity = request.env["erp.security"].sudo()
+        tokens = ErpSecurity.refresh_session(data["refresh_token"])
+        if not tokens:
+            return json_Response({"error": "Invalid refresh token"}, 401)
+        return json_Response(tokens, 200)
+
+    @http.route(
+        "/api/erp/.well-known/jwks.json",
+        type="http",
+        auth="public",
+        methods=["GET"],
+        csrf=False,
+    )
+    def get_jwks(self):
+        """Public keys of the asymmetric ERP token signing keys."""
+        body, etag = request.env["erp.security"].sudo()._get_public_jwks()
+        headers = {
+            "Cache-Control": f"public, max-age={JWKS_MAX_AGE}",
+            "ETag": f'"{etag}"',
+        }
+        if etag in request.httprequest.if_none_match:
+            return http.Response(status=304, headers=headers)
+        return http.Response(
+            body,
+            content_type="application/jwk-set+json; charset=utf-8",
+            status=200,
+            headers=headers,
+        )
+
     @http.route(
         "/api/erp/token/verify",
         type="http",
@@ -165,9 +406,10 @@ class AppSecurityController(http.Controller):
             token = authorization[7:]
 
         ErpSecurity = request.env["erp.security"].sudo()
-        verify_result = ErpSecurity.decode_token(token)
+        verify_result = ErpSecurity.verify_token(token)
         if verify_result and isinstance(verify_result, http.Response):
             return verify_result
+        ErpSecurity._track_token_usage(verify_result)
         return json_Response({"valid": True}, 200)
 
     @http.route(
@@ -184,10 +426,7 @@ class AppSecurityController(http.Controller):
 
         token = data["token"]
         ErpSecurity = request.env["erp.security"].sudo()
-        record = ErpSecurity.search([("jwt_token", "=", token)], limit=1)
-        if record and record.active:
-            record.active = False
-            record.jwt_token = False
+        if ErpSecurity.revoke_token(token):
             return json_Response({"success": True}, 200)
         else:
             return json_Response({"error": "Invalid token"}, 401)
@@ -1,4 +1,8 @@
 from . import api_test_model
 from . import erp_security
+from . import erp_rate_limit
+from . import hr_employee
+from . import omc_csi
+from . import webhook_circuit_breaker
 from . import webhook_notification
 from . import webhook_config
@@ -2,6 +2,7 @@ from odoo import models, fields, api
 import requests
 import json
 from odoo.exceptions import UserError
+from ..utils import http_client
 
 
 class ApiTypeModel(models.Model):
@@ -129,15 +130,17 @@ class ApiTestModel(models.Model):
             start_time = time.time()
 
             if self.method == "GET":
-                response = requests.get(url, headers=headers, timeout=30)
+                response = http_client.get(url, headers=headers, timeout=30)
             elif self.method == "POST":
-                response = requests.post(url, headers=headers, json=data, timeout=30)
+                response = http_client.post(url, headers=headers, json=data, timeout=30)
             elif self.method == "PUT":
-                response = requests.put(url, headers=headers, json=data, timeout=30)
+                response = http_client.put(url, headers=headers, json=data, timeout=30)
             elif self.method == "PATCH":
-                response = requests.patch(url, headers=headers, json=data, timeout=30)
+                response = http_client.patch(
+                    url, headers=headers, json=data, timeout=30
+                )
             elif self.method == "DELETE":
-                response = requests.delete(url, headers=headers, timeout=30)
+                response = http_client.delete(url, headers=headers, timeout=30)
 
             end_time = time.time()
 
@@ -0,0 +1,113 @@
+from odoo import models, fields, api
+from ..utils.rate_limit import TokenBucketLimiter
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Per-worker buckets, keyed by scope and rebuilt when the settings change
+_memory_limiters = {}
+
+DEFAULT_LIMITS = {
+    "ip": (1.0, 20.0),
+    "identity": (0.2, 5.0),
+}
+
+
+class ErpRateLimit(models.Model):
+    _name = "erp.rate_limit"
+    _description = "ERP Rate Limit Bucket"
+
+    key = fields.Char(string="Key", required=True, readonly=True)
+    tokens = fields.Float(string="Tokens", readonly=True)
+    allowed = fields.Boolean(string="Last Request Allowed", readonly=True)
+    updated_at = fields.Datetime(string="Updated At", readonly=True, index=True)
+
+    _sql_constraints = [
+        ("unique_key", "unique(key)", "Only one bucket per key is allowed!"),
+    ]
+
+    @api.model
+    def _get_limit_settings(self, scope):
+        """Return ``(rate per second, burst)`` for a scope and the mode."""
+        ICP = self.env["ir.config_parameter"].sudo()
+        rate, burst = DEFAULT_LIMITS[scope]
+        try:
+            rate = float(ICP.get_param(f"erp_rate_limit_{scope}_rate", rate))
+            burst = float(ICP.get_param(f"erp_rate_limit_{scope}_burst", burst))
+        except ValueError:
+            pass
+        return rate, burst
+
+    @api.model
+    def _consume(self, scope, key, cost=1):
+        """Take ``cost`` tokens from the bucket of ``key`` in ``scope``.
+
+        Returns 0 when the request is allowed, otherwise the number of
+        seconds after which it may be retried. ``erp_rate_limit_mode``
+        selects per-worker buckets ("memory") or buckets shared by all
+        workers in the database ("db").
+        """
+        rate, burst = self._get_limit_settings(scope)
+        if rate <= 0:
+            return 0
+        mode = (
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("erp_rate_limit_mode", "memory")
+        )
+        if mode == "db":
+            return self._consume_shared(f"{scope}:{key}", rate, burst, cost)
+
+        limiter = _memory_limiters.get(scope)
+        if limiter is None or (limiter.rate, limiter.burst) != (rate, burst):
+            limiter = _memory_limiters[scope] = TokenBucketLimiter(rate, burst)
+        return limiter.consume(key, cost)
+
+    @api.model
+    def _consume_shared(self, key, rate, burst, cost):
+        """Token bucket stored in the database, updated with one atomic upsert.
+
+        Runs on its own short transaction so the bucket row is never locked
+        for the duration of the request.
+        """
+        refill = """
+            LEAST(%(burst)s, erp_rate_limit.tokens + %(rate)s * EXTRACT(
+                EPOCH FROM (now() at time zone 'UTC') - erp_rate_limit.updated_at))
+        """
+        try:
+            with self.pool.cursor() as cr:
+                cr.execute(
+                    f"""
+                    INSERT INTO erp_rate_limit (key, tokens, allowed, updated_at)
+                    VALUES (%(key)s, %(burst)s - %(cost)s, true,
+                            now() at time zone 'UTC')
+                    ON CONFLICT (key) DO UPDATE SET
+                        tokens = CASE WHEN {refill} >= %(cost)s
+                                      THEN {refill} - %(cost)s
+                                      ELSE {refill} END,
+                        allowed = {refill} >= %(cost)s,
+                        updated_at = now() at time zone 'UTC'
+                    RETURNING tokens, allowed
+                    """,
+                    {"key": key, "rate": rate, "burst": burst, "cost": cost},
+                )
+                tokens, allowed = cr.fetchone()
+        except Exception:
+            # Never turn a rate limiter failure into a login outage
+            _logger.exception("Shared rate limiter unavailable, allowing request")
+            return 0
+        if allowed:
+            return 0
+        return (cost - tokens) / rate
+
+    @api.model
+    def _cron_gc_buckets(self, idle_hours=1):
+        """Delete shared buckets idle long enough to be full again."""
+        self.env.cr.execute(
+            """
+            DELETE FROM erp_rate_limit
+             WHERE updated_at < (now() at time zone 'UTC') - %s * interval '1 hour'
+            """,
+            (idle_hours,),
+        )
+        return self.env.cr.rowcount
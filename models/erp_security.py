@@ -1,11 +1,96 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from odoo.exceptions import UserError
+from odoo.modules.registry import Registry
 import jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from ..utils import http_client
 from ..utils.helpers import json_Response
+from ..utils.log_sink import get_ilog_stats
+from ..utils.upstream import get_upstream_stats, upstream_cache
+from .omc_csi import api_key_cache
+from ..utils.revocation import RevocationSet
+from ..utils.signing_keys import (
+    ASYMMETRIC_ALGORITHMS,
+    SIGNING_ALGORITHMS,
+    generate_signing_key,
+    load_signing_key,
+    public_jwk,
+)
+from ..utils.ttl_cache import TTLCache
+from ..utils.write_behind import CoalescingBuffer
 import secrets
 import json
+import functools
+import hashlib
+import logging
+import os
+import uuid
 # import string
 
+_logger = logging.getLogger(__name__)
+
+# pg advisory lock serializing secret key rotations
+KEY_ROTATION_LOCK_ID = 0x45525053
+
+
+def _token_digest(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _epoch(value):
+    """Return the epoch of a naive UTC datetime."""
+    return value.replace(tzinfo=timezone.utc).timestamp() if value else 0
+
+
+verified_token_cache = TTLCache(
+    max_entries=int(os.getenv("ERP_TOKEN_CACHE_MAX_ENTRIES", "10000")),
+    default_ttl=int(os.getenv("ERP_TOKEN_CACHE_TTL", "300")),
+)
+
+REVOCATION_SYNC_OVERLAP = 60
+revoked_tokens = RevocationSet(
+    sync_interval=int(os.getenv("ERP_REVOCATION_SYNC_INTERVAL", "5"))
+)
+
+# last_used updates are flushed by a timer thread every ACTIVITY_FLUSH_SECONDS,
+# or as soon as ACTIVITY_FLUSH_ENTRIES are pending; at most that many seconds
+# of them are lost if a worker dies.
+ACTIVITY_FLUSH_ENTRIES = int(os.getenv("ERP_ACTIVITY_FLUSH_ENTRIES", "500"))
+ACTIVITY_FLUSH_SECONDS = int(os.getenv("ERP_ACTIVITY_FLUSH_SECONDS", "30"))
+_activity_buffers = {}
+
+
+def _flush_activity(dbname, batch):
+    """Apply coalesced ``jti -> last_used`` updates in one UPDATE."""
+    rows = list(batch.items())
+    values = ", ".join(["(%s::varchar, %s::timestamp)"] * len(rows))
+    params = [value for row in rows for value in row]
+    with Registry(dbname).cursor() as cr:
+        cr.execute(
+            f"""
+            UPDATE erp_security AS s
+               SET last_used = v.last_used
+              FROM (VALUES {values}) AS v(jti, last_used)
+             WHERE s.jti = v.jti
+               AND (s.last_used IS NULL OR s.last_used < v.last_used)
+            """,
+            params,
+        )
+
+
+def _get_activity_buffer(dbname):
+    buffer = _activity_buffers.get(dbname)
+    if buffer is None:
+        buffer = _activity_buffers.setdefault(
+            dbname,
+            CoalescingBuffer(
+                functools.partial(_flush_activity, dbname),
+                max_entries=ACTIVITY_FLUSH_ENTRIES,
+                max_age=ACTIVITY_FLUSH_SECONDS,
+            ),
+        )
+    return buffer
+
 
 # class EmployeeSecurity(models.Model):
 #     _name = "employee.security"
@@ -92,6 +177,19 @@ class ErpSecurity(models.Model):
     #             record.secret_key = False
 
     jwt_token = fields.Text(string="ERP JWT Token", readonly=True)
+    jti = fields.Char(string="Token ID", index=True, readonly=True, copy=False)
+    token_digest = fields.Char(
+        string="Token Digest", index=True, readonly=True, copy=False
+    )
+    revoked_at = fields.Datetime(
+        string="Revoked At", index=True, readonly=True, copy=False
+    )
+    refresh_token_digest = fields.Char(
+        string="Refresh Token Digest", index=True, readonly=True, copy=False
+    )
+    refresh_expiry = fields.Datetime(
+        string="Refresh Expiry", readonly=True, copy=False
+    )
     active = fields.Boolean(string="Active", default=True, readonly=True)
     created_at = fields.Datetime(
         string="Created At",
@@ -106,13 +204,25 @@ class ErpSecurity(models.Model):
     expiry_time_interval = fields.Float(
         string="Expiry Time Interval (minutes)", default=5, readonly=True
     )
+    # Stored so expired sessions can be found in SQL; generate_token writes
+    # the actual exp of the issued token over the computed value.
     expiry_after = fields.Datetime(
         string="Expiry After",
-        default=lambda: fields.Datetime.now() + timedelta(minutes=5),
         compute="_compute_expiry_after",
-        readonly=True,
+        store=True,
+        index=True,
+        readonly=False,
     )
 
+    def init(self):
+        # Covers the session lookup done by /api/erp/jwt2_token
+        tools.create_index(
+            self._cr,
+            "erp_security_session_lookup_idx",
+            self._table,
+            ["national_id", "salis_session_id", "active"],
+        )
+
     @api.depends("created_at", "expiry_time_interval")
     def _compute_expiry_after(self):
         for record in self:
@@ -125,13 +235,8 @@ class ErpSecurity(models.Model):
 
     # SECRET KEY MANAGEMENT WITH HISTORY
     @api.model
-    def _get_secret_key_list(self):
-        """Return list of keys (latest first), rotating if expired."""
-        ICP = self.env["ir.config_parameter"].sudo()
-
-        keys_json = ICP.get_param("erp_secret_keys")
-        key_time_str = ICP.get_param("erp_secret_key_time")
-
+    def _load_stored_keys(self, keys_json):
+        """Return the stored key entries, latest first."""
         if isinstance(keys_json, str) and keys_json.strip():
             try:
                 keys = json.loads(keys_json)
@@ -141,33 +246,141 @@ class ErpSecurity(models.Model):
                 keys = []
         else:
             keys = []
+        return keys
+
+    @api.model
+    def _parse_key_ring(self, keys_json, key_time_str):
+        """Parse the stored key list and rotation time.
+
+        Returns ``(keys, key_time, keys_by_kid)``, keys being ``SigningKey``
+        tuples, latest first.
+        """
+        keys = [
+            key
+            for key in map(load_signing_key, self._load_stored_keys(keys_json))
+            if key
+        ]
+        key_time = self._parse_key_time(key_time_str)
+        return tuple(keys), key_time, {key.kid: key for key in keys}
 
+    @api.model
+    def _parse_key_time(self, key_time_str):
         # Parse key timestamp safely
         try:
-            key_time = (
+            return (
                 fields.Datetime.from_string(key_time_str)
                 if isinstance(key_time_str, str)
-                else datetime.now()
+                else None
             )
         except Exception:
-            key_time = datetime.now()
+            return None
+
+    @api.model
+    @tools.ormcache()
+    def _get_key_ring(self):
+        """Return the parsed keys, their rotation time and the kid -> key map.
 
-        # Rotation configuration
-        rotation_interval_hours = 24
-        max_keys_to_keep = 3
+        Cached per registry: writing ``ir.config_parameter`` clears the
+        registry caches, and the other workers drop theirs through Odoo's
+        cache signaling, so the keys are only re-parsed when they change.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        return self._parse_key_ring(
+            ICP.get_param("erp_secret_keys"), ICP.get_param("erp_secret_key_time")
+        )
+
+    @api.model
+    def _get_key_rotation_settings(self):
+        """Return the rotation interval (hours) and the number of keys kept."""
+        ICP = self.env["ir.config_parameter"].sudo()
+        try:
+            rotation_interval_hours = float(
+                ICP.get_param("erp_secret_key_rotation_hours", 24)
+            )
+        except ValueError:
+            rotation_interval_hours = 24
+        try:
+            max_keys_to_keep = int(ICP.get_param("erp_secret_key_retention", 3))
+        except ValueError:
+            max_keys_to_keep = 3
+        return rotation_interval_hours, max(max_keys_to_keep, 1)
+
+    @api.model
+    def _get_signing_algorithm(self):
+        """Return the configured token signing algorithm."""
+        alg = (
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("erp_token_signing_alg", "HS256")
+        )
+        return alg if alg in SIGNING_ALGORITHMS else "HS256"
+
+    @api.model
+    def _rotate_secret_keys(self, force=False):
+        """Add a new signing key if the current one is due for rotation.
+
+        Serialized with a transaction-level advisory lock, so concurrent
+        callers skip instead of racing on ``ir.config_parameter``. The keys
+        are re-read from the database under the lock rather than from the
+        registry cache, which may predate another worker's rotation.
+        Changing ``erp_token_signing_alg`` makes the next run rotate at once.
+        Returns True when a new key was written.
+        """
+        cr = self.env.cr
+        cr.execute("SELECT pg_try_advisory_xact_lock(%s)", (KEY_ROTATION_LOCK_ID,))
+        if not cr.fetchone()[0]:
+            _logger.info("ERP secret key rotation already running, skipping")
+            return False
+
+        cr.execute(
+            "SELECT key, value FROM ir_config_parameter WHERE key IN %s",
+            (("erp_secret_keys", "erp_secret_key_time"),),
+        )
+        params = dict(cr.fetchall())
+        keys = self._load_stored_keys(params.get("erp_secret_keys"))
+        key_time = self._parse_key_time(params.get("erp_secret_key_time"))
+        alg = self._get_signing_algorithm()
+        active_key = load_signing_key(keys[0]) if keys else None
+
+        rotation_interval_hours, max_keys_to_keep = self._get_key_rotation_settings()
         now = datetime.now()
         if key_time is not None:
             diff = now - key_time
         else:
             diff = timedelta.max  # Force key rotation if key_time is None
-        # Generate or rotate if needed
-        if not keys or diff.total_seconds() > rotation_interval_hours * 3600:
-            new_key = secrets.token_urlsafe(64)
-            keys.insert(0, new_key)
-            keys = keys[:max_keys_to_keep]
-            ICP.set_param("erp_secret_keys", json.dumps(keys))
-            ICP.set_param("erp_secret_key_time", fields.Datetime.to_string(now))
+        due = diff.total_seconds() > rotation_interval_hours * 3600
+        if active_key and active_key.alg != alg:
+            due = True
+        if keys and not force and not due:
+            return False
+
+        keys.insert(0, generate_signing_key(alg))
+        keys = keys[:max_keys_to_keep]
+        ICP = self.env["ir.config_parameter"].sudo()
+        # set_param clears the registry caches, including _get_key_ring
+        ICP.set_param("erp_secret_keys", json.dumps(keys))
+        ICP.set_param("erp_secret_key_time", fields.Datetime.to_string(now))
+        _logger.info("ERP %s key rotated, %s key(s) retained", alg, len(keys))
+        return True
+
+    @api.model
+    def _cron_rotate_secret_keys(self):
+        self._rotate_secret_keys()
+
+    @api.model
+    def _get_secret_key_list(self):
+        """Return list of keys (latest first).
 
+        Read-only: rotation is done by the scheduled action. Keys are only
+        written here when none exist at all (fresh database).
+        """
+        keys = list(self._get_key_ring()[0])
+        if not keys:
+            _logger.warning("No ERP secret key found, generating the first one")
+            self._rotate_secret_keys()
+            keys = list(self._get_key_ring()[0])
+        if not keys:
+            raise UserError("No ERP signing key is available yet.")
         return keys
 
     @api.model
@@ -175,52 +388,439 @@ class ErpSecurity(models.Model):
         """Return only the latest key."""
         return self._get_secret_key_list()[0]
 
+    @api.model
+    def _prepare_token_vals(self, values, signing_key):
+        """Sign a token for ``values`` (session field values) with ``signing_key``.
+
+        Returns the values to store on the session row.
+        """
+        payload = {
+            "user_id": values.get("salis_user_id"),
+            "employee_id": values.get("employee_id"),
+            "national_id": values.get("national_id"),
+            "session_id": values.get("salis_session_id"),
+            "jti": uuid.uuid4().hex,
+            "exp": fields.Datetime.now()
+            + timedelta(minutes=values["expiry_time_interval"]),
+        }
+        token = jwt.encode(
+            payload,
+            signing_key.key,
+            algorithm=signing_key.alg,
+            headers={"kid": signing_key.kid},
+        )
+        return {
+            "jwt_token": token,
+            "jti": payload["jti"],
+            "token_digest": _token_digest(token),
+            "expiry_after": payload["exp"],
+        }
+
     def generate_token(self):
         """Generate JWT token using latest key."""
-        secret_key = self._get_active_secret_key()
+        signing_key = self._get_active_secret_key()
         for record in self:
             if record.employee_id:
-                payload = {
-                    "user_id": record.salis_user_id,
-                    "employee_id": record.employee_id.id,
-                    "national_id": record.national_id,
-                    "session_id": record.salis_session_id,
-                    "exp": datetime.now()
-                    + timedelta(minutes=record.expiry_time_interval),
-                }
-                token = jwt.encode(payload, secret_key, algorithm="HS256")
-                record.jwt_token = token
+                record.write(
+                    self._prepare_token_vals(
+                        {
+                            "salis_user_id": record.salis_user_id,
+                            "employee_id": record.employee_id.id,
+                            "national_id": record.national_id,
+                            "salis_session_id": record.salis_session_id,
+                            "expiry_time_interval": record.expiry_time_interval,
+                        },
+                        signing_key,
+                    )
+                )
 
+    @api.model_create_multi
     def create(self, vals_list):
-        user_employee = self.env["hr.employee"].search(
-            [("identification_id", "=", vals_list["national_id"])], limit=1
+        """Create sessions and sign their tokens in one pass.
+
+        Employees are resolved with a single query and the signing key is
+        fetched once, so the tokens are part of the INSERT itself.
+        """
+        Employee = self.env["hr.employee"]
+        national_ids = [vals.get("national_id") for vals in vals_list]
+        if len(vals_list) == 1:
+            employee_ids = {
+                national_ids[0]: Employee._get_employee_id_by_national_id(
+                    national_ids[0]
+                )
+            }
+        else:
+            employee_ids = Employee._get_employee_ids_by_national_ids(national_ids)
+
+        signing_key = None
+        default_interval = self.default_get(["expiry_time_interval"]).get(
+            "expiry_time_interval", 5
         )
-        vals_list["employee_id"] = user_employee.id
+        for vals in vals_list:
+            if not vals.get("employee_id"):
+                vals["employee_id"] = employee_ids.get(vals.get("national_id"), False)
+            if not vals["employee_id"]:
+                continue
+            signing_key = signing_key or self._get_active_secret_key()
+            vals.update(
+                self._prepare_token_vals(
+                    dict(
+                        vals,
+                        expiry_time_interval=vals.get(
+                            "expiry_time_interval", default_interval
+                        ),
+                    ),
+                    signing_key,
+                )
+            )
+        return super().create(vals_list)
 
-        result = super().create(vals_list)
+    @api.model
+    def issue_tokens(self, sessions):
+        """Issue tokens for many sessions in one batch.
 
-        for record in result:
-            record.generate_token()
-        return result
+        ``sessions`` is a list of dicts with ``salis_session_id``,
+        ``salis_user_id`` and ``national_id``. Returns one dict per session,
+        in the same order, holding either ``jwt2_token`` or ``error``.
+        """
+        required_fields = ["salis_session_id", "salis_user_id", "national_id"]
+        results = [None] * len(sessions)
+        valid = []
+        for index, session in enumerate(sessions):
+            if not isinstance(session, dict):
+                results[index] = {"error": "Invalid session"}
+                continue
+            missing = [name for name in required_fields if not session.get(name)]
+            if missing:
+                results[index] = {"error": f'Missing fields: {", ".join(missing)}'}
+                continue
+            valid.append((index, {name: session[name] for name in required_fields}))
 
+        employee_ids = self.env["hr.employee"]._get_employee_ids_by_national_ids(
+            [vals["national_id"] for _index, vals in valid]
+        )
+        to_create = []
+        for index, vals in valid:
+            vals["employee_id"] = employee_ids.get(vals["national_id"])
+            if not vals["employee_id"]:
+                results[index] = {"error": "Employee Not found"}
+                continue
+            to_create.append((index, vals))
+        if not to_create:
+            return results
+
+        # Deactivate the previous tokens of these sessions in one write
+        sessions_keys = {
+            (vals["national_id"], vals["salis_session_id"])
+            for _index, vals in to_create
+        }
+        existing = self.search(
+            [
+                ("national_id", "in", [key[0] for key in sessions_keys]),
+                ("salis_session_id", "in", [key[1] for key in sessions_keys]),
+                ("active", "=", True),
+            ]
+        )
+        existing.filtered(
+            lambda rec: (rec.national_id, rec.salis_session_id) in sessions_keys
+        ).write({"active": False})
+
+        refresh_tokens = []
+        for _index, vals in to_create:
+            refresh_token, refresh_vals = self._new_refresh_token()
+            vals.update(refresh_vals)
+            refresh_tokens.append(refresh_token)
+        records = self.create([vals for _index, vals in to_create])
+        for (index, vals), record, refresh_token in zip(
+            to_create, records, refresh_tokens
+        ):
+            results[index] = {
+                "salis_session_id": vals["salis_session_id"],
+                "national_id": vals["national_id"],
+                "jwt2_token": record.jwt_token,
+                "refresh_token": refresh_token,
+            }
+        return results
+
+    @api.model
     def decode_token(self, token):
-        self.ensure_one()
+        """Verify ``token`` with the key named by its ``kid`` header.
+
+        Tokens issued before key ids were introduced carry no ``kid`` and are
+        still tried against every retained key.
+        """
+        return self._decode_token(token)[0]
+
+    @api.model
+    def _decode_token(self, token):
+        """Return the payload (or an error response) and the kid that verified it."""
         # erp_record = self.search([("jwt_token", "=", token)], limit=1)
         # if not erp_record:
         #     return json_Response({"error": "ERP record not found for this token"}, 404)
-        keys = self._get_secret_key_list()
+        if not token:
+            return json_Response({"error": "Invalid token"}, 401), None
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.InvalidTokenError:
+            return json_Response({"error": "Invalid token"}, 401), None
+
+        keys, _key_time, keys_by_kid = self._get_key_ring()
+        if kid:
+            if kid not in keys_by_kid:
+                return json_Response({"error": "Invalid token"}, 401), None
+            keys = [keys_by_kid[kid]]
+        else:
+            # Tokens without kid predate asymmetric signing
+            keys = [key for key in keys if key.alg == "HS256"]
         for key in keys:
             try:
                 payload = jwt.decode(
                     token,
-                    key,
+                    key.verify_key,
                     # erp_record.secret_key,
-                    algorithms=["HS256"],
+                    algorithms=[key.alg],
                     options={"verify_exp": True},
                 )
-                return payload
+                return payload, key.kid
             except jwt.ExpiredSignatureError:
-                return json_Response({"error": "Token has expired"}, 401)
+                return json_Response({"error": "Token has expired"}, 401), None
             except jwt.InvalidTokenError:
                 continue
-        return json_Response({"error": "Invalid token"}, 401)
+        return json_Response({"error": "Invalid token"}, 401), None
+
+    @api.model
+    def verify_token(self, token):
+        """Return the payload of ``token`` (or an error response), cached.
+
+        Verified tokens are cached by digest until their ``exp``. A cached
+        entry is dropped as soon as its key leaves the key ring or the token
+        is revoked through ``_invalidate_verified_token``.
+        """
+        if not token:
+            return json_Response({"error": "Invalid token"}, 401)
+        digest = _token_digest(token)
+        cached = verified_token_cache.get(digest)
+        if cached is not None:
+            payload, kid = cached
+            if kid in self._get_key_ring()[2]:
+                return self._check_not_revoked(payload)
+            verified_token_cache.pop(digest)
+
+        payload, kid = self._decode_token(token)
+        if isinstance(payload, dict) and payload.get("exp"):
+            verified_token_cache.set(digest, (payload, kid), expires_at=payload["exp"])
+        return self._check_not_revoked(payload)
+
+    @api.model
+    def _track_token_usage(self, payload):
+        """Record that a token was used; last_used is written behind, in bulk."""
+        if isinstance(payload, dict) and payload.get("jti"):
+            _get_activity_buffer(self.env.cr.dbname).add(
+                payload["jti"], fields.Datetime.now()
+            )
+
+    # TOKEN REVOCATION
+    def _check_not_revoked(self, payload):
+        if isinstance(payload, dict) and self._is_token_revoked(payload.get("jti")):
+            return json_Response({"error": "Token has been revoked"}, 401)
+        return payload
+
+    @api.model
+    def _is_token_revoked(self, jti):
+        """O(1) check against the in-memory revocation set."""
+        if not jti:
+            return False
+        if revoked_tokens.needs_sync():
+            self._sync_revoked_tokens()
+        return jti in revoked_tokens
+
+    @api.model
+    def _sync_revoked_tokens(self):
+        """Load the revocations committed since the last sync of this worker."""
+        self.flush_model(["jti", "revoked_at", "expiry_after"])
+        now = fields.Datetime.now()
+        query = """
+            SELECT jti, expiry_after
+              FROM erp_security
+             WHERE jti IS NOT NULL
+        """
+        if revoked_tokens.last_sync is None:
+            query += " AND revoked_at IS NOT NULL AND expiry_after > %s"
+            params = (now,)
+        else:
+            # Overlap the previous window: revocations are stamped before commit
+            query += " AND revoked_at >= %s"
+            params = (
+                revoked_tokens.last_sync - timedelta(seconds=REVOCATION_SYNC_OVERLAP),
+            )
+        self.env.cr.execute(query, params)
+        for jti, expires_at in self.env.cr.fetchall():
+            revoked_tokens.add(jti, _epoch(expires_at))
+        revoked_tokens.mark_synced(now)
+
+    @api.model
+    def revoke_token(self, token):
+        """Revoke an active token; return False if it is unknown."""
+        if not token:
+            return False
+        self._invalidate_verified_token(token)
+        record = self.search([("token_digest", "=", _token_digest(token))], limit=1)
+        if not record:
+            return False
+        revoked_tokens.add(record.jti, _epoch(record.expiry_after))
+        record.write(
+            {
+                "active": False,
+                "jwt_token": False,
+                "refresh_token_digest": False,
+                "revoked_at": fields.Datetime.now(),
+            }
+        )
+        return True
+
+    # REFRESH TOKENS
+    @api.model
+    def _new_refresh_token(self):
+        """Return a new opaque refresh token and the values storing it.
+
+        Only the digest of the refresh token is stored on the session.
+        """
+        ICP = self.env["ir.config_parameter"].sudo()
+        try:
+            lifetime_hours = float(
+                ICP.get_param("erp_refresh_token_lifetime_hours", 168)
+            )
+        except ValueError:
+            lifetime_hours = 168
+        refresh_token = secrets.token_urlsafe(48)
+        return refresh_token, {
+            "refresh_token_digest": _token_digest(refresh_token),
+            "refresh_expiry": fields.Datetime.now() + timedelta(hours=lifetime_hours),
+        }
+
+    @api.model
+    def refresh_session(self, refresh_token):
+        """Renew the access token of the session owning ``refresh_token``.
+
+        The refresh token is rotated on every use: the one presented stops
+        working and a new one is returned with the new access token, as
+        ``{"jwt2_token": ..., "refresh_token": ...}``. Returns None when the
+        refresh token is unknown, revoked or expired. No upstream call is made.
+        """
+        if not refresh_token:
+            return None
+        record = self.search(
+            [("refresh_token_digest", "=", _token_digest(refresh_token))], limit=1
+        )
+        if (
+            not record
+            or not record.employee_id.active
+            or not record.refresh_expiry
+            or record.refresh_expiry < fields.Datetime.now()
+        ):
+            return None
+
+        new_refresh_token, vals = self._new_refresh_token()
+        # Rotation keeps the absolute lifetime of the session
+        vals["refresh_expiry"] = record.refresh_expiry
+        vals.update(
+            self._prepare_token_vals(
+                {
+                    "salis_user_id": record.salis_user_id,
+                    "employee_id": record.employee_id.id,
+                    "national_id": record.national_id,
+                    "salis_session_id": record.salis_session_id,
+                    "expiry_time_interval": record.expiry_time_interval,
+                },
+                self._get_active_secret_key(),
+            )
+        )
+        # A concurrent refresh with the same token fails on this row update
+        record.write(vals)
+        return {"jwt2_token": record.jwt_token, "refresh_token": new_refresh_token}
+
+    @api.model
+    def _invalidate_verified_token(self, token):
+        if token:
+            verified_token_cache.pop(_token_digest(token))
+
+    # SESSION PURGE
+    @api.model
+    def _cron_purge_expired_sessions(
+        self, batch_size=1000, max_batches=50, grace_minutes=60
+    ):
+        """Archive expired sessions, then delete expired inactive ones.
+
+        A session stays active while its refresh token is still valid.
+
+        Works in batches of ``batch_size`` rows and commits after each one, so
+        the sweep never holds long locks on the table. Returns the number of
+        rows archived and deleted.
+        """
+        self.flush_model()
+        cr = self.env.cr
+        cutoff = fields.Datetime.now() - timedelta(minutes=grace_minutes)
+        counts = {"archived": 0, "deleted": 0}
+        queries = {
+            "archived": """
+                UPDATE erp_security SET active = false
+                 WHERE id IN (
+                    SELECT id FROM erp_security
+                     WHERE active AND expiry_after < %(cutoff)s
+                       AND (refresh_expiry IS NULL OR refresh_expiry < %(cutoff)s)
+                     LIMIT %(limit)s FOR UPDATE SKIP LOCKED)
+            """,
+            "deleted": """
+                DELETE FROM erp_security
+                 WHERE id IN (
+                    SELECT id FROM erp_security
+                     WHERE active IS NOT TRUE AND expiry_after < %(cutoff)s
+                     LIMIT %(limit)s FOR UPDATE SKIP LOCKED)
+            """,
+        }
+        for operation, query in queries.items():
+            for _batch in range(max_batches):
+                cr.execute(query, {"cutoff": cutoff, "limit": batch_size})
+                processed = cr.rowcount
+                counts[operation] += processed
+                cr.commit()
+                if processed < batch_size:
+                    break
+        self.invalidate_model()
+        _logger.info(
+            "ERP security purge: %(archived)s archived, %(deleted)s deleted", counts
+        )
+        return counts
+
+    # PUBLIC KEYS
+    @api.model
+    @tools.ormcache()
+    def _get_public_jwks(self):
+        """Return the JWKS document of the asymmetric keys and its ETag.
+
+        Retained keys stay published until rotated out, so tokens signed
+        before a rotation keep verifying downstream.
+        """
+        keys = [
+            public_jwk(key)
+            for key in self._get_key_ring()[0]
+            if key.alg in ASYMMETRIC_ALGORITHMS
+        ]
+        body = json.dumps({"keys": keys}, sort_keys=True)
+        return body, hashlib.sha256(body.encode()).hexdigest()[:32]
+
+    @api.model
+    def get_cache_stats(self):
+        """Return the cache, upstream and connection pool statistics of this worker."""
+        return {
+            "verified_tokens": verified_token_cache.stats(),
+            "revoked_tokens": len(revoked_tokens),
+            "activity": {
+                dbname: buffer.stats() for dbname, buffer in _activity_buffers.items()
+            },
+            "ilog": get_ilog_stats(),
+            "api_keys": api_key_cache.stats(),
+            "upstream_cache": upstream_cache.stats(),
+            "upstream": get_upstream_stats(),
+            "http_pool": http_client.get_pool_stats(),
+        }
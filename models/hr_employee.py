@@ -0,0 +1,54 @@
+from odoo import models, fields, api, tools
+
+
+class HrEmployee(models.Model):
+    _inherit = "hr.employee"
+
+    identification_id = fields.Char(index=True)
+
+    @api.model
+    @tools.ormcache("national_id")
+    def _get_employee_id_by_national_id(self, national_id):
+        """Return the id of the employee with this national ID, or False.
+
+        Cached per registry; cleared when employees are created, unlinked or
+        get a new national ID, and in other workers through cache signaling.
+        """
+        if not national_id:
+            return False
+        employee = self.sudo().search(
+            [("identification_id", "=", national_id)], limit=1
+        )
+        return employee.id
+
+    @api.model
+    def _get_employee_ids_by_national_ids(self, national_ids):
+        """Resolve many national IDs in one query: {national_id: employee_id}."""
+        national_ids = list({nid for nid in national_ids if nid})
+        if not national_ids:
+            return {}
+        result = {}
+        for employee in self.sudo().search_read(
+            [("identification_id", "in", national_ids)], ["identification_id"]
+        ):
+            # First match in search order, like the single-record lookup
+            result.setdefault(employee["identification_id"], employee["id"])
+        return result
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        employees = super().create(vals_list)
+        if any(vals.get("identification_id") for vals in vals_list):
+            self.clear_caches()
+        return employees
+
+    def write(self, vals):
+        res = super().write(vals)
+        if "identification_id" in vals or "active" in vals:
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.clear_caches()
+        return res
@@ -0,0 +1,132 @@
+from odoo import models, api
+from odoo.models import MAGIC_COLUMNS
+from odoo.modules.registry import Registry
+from ..utils.ttl_cache import TTLCache
+import hashlib
+import json
+import os
+import time
+
+API_KEY_CACHE_TTL = int(os.getenv("ISALIS_API_KEY_CACHE_TTL", "60"))
+API_KEY_CACHE_NEGATIVE_TTL = int(os.getenv("ISALIS_API_KEY_CACHE_NEGATIVE_TTL", "10"))
+API_KEY_CACHE_MAX_ENTRIES = int(os.getenv("ISALIS_API_KEY_CACHE_MAX_ENTRIES", "1024"))
+# How often a worker looks for omc.csi changes made by the other workers
+API_KEY_CACHE_SYNC_INTERVAL = int(os.getenv("ISALIS_API_KEY_CACHE_SYNC_INTERVAL", "5"))
+
+API_KEY_HEADER = "API-KEY"
+
+# sha256 of the API key, br, ccd, user and company -> omc.csi id, 0 if rejected
+api_key_cache = TTLCache(
+    max_entries=API_KEY_CACHE_MAX_ENTRIES,
+    default_ttl=API_KEY_CACHE_TTL,
+    sizeof=lambda value: 1,
+)
+_api_key_cache_state = {"generation": None, "checked_at": None}
+
+
+class OmcCsi(models.Model):
+    _inherit = "omc.csi"
+
+    def init(self):
+        super().init()
+        # Bumped after each commit changing validation data; see get_api_csi
+        self.env.cr.execute("CREATE SEQUENCE IF NOT EXISTS omc_csi_api_key_cache_seq")
+
+    def _api_key_cache_key(self, *args, h=None, br=None, ccd=None, **kwargs):
+        """Digest of the inputs deciding a ``get_api_csi`` lookup, or None.
+
+        These are the API-KEY header, ``br`` and ``ccd``, and the user and
+        company of the environment. Calls without an API key or with other
+        arguments are not cached.
+        """
+        api_key = h.get(API_KEY_HEADER) if h is not None else None
+        if args or kwargs or not api_key:
+            return None
+        scalars = (str, int, bool, type(None))
+        if not isinstance(br, scalars) or not isinstance(ccd, scalars):
+            return None
+        material = [api_key, br, ccd, self.env.uid, self.env.su, self.env.company.id]
+        return hashlib.sha256(json.dumps(material).encode()).hexdigest()
+
+    def _sync_api_key_cache(self):
+        """Drop the cache when another worker committed omc.csi changes."""
+        now = time.monotonic()
+        checked_at = _api_key_cache_state["checked_at"]
+        if checked_at is not None and now - checked_at < API_KEY_CACHE_SYNC_INTERVAL:
+            return
+        self.env.cr.execute(
+            "SELECT last_value, is_called FROM omc_csi_api_key_cache_seq"
+        )
+        generation = self.env.cr.fetchone()
+        if generation != _api_key_cache_state["generation"]:
+            api_key_cache.clear()
+            _api_key_cache_state["generation"] = generation
+        _api_key_cache_state["checked_at"] = now
+
+    def get_api_csi(self, *args, **kwargs):
+        """Cache the result per worker, keyed on the API key, br and ccd.
+
+        Accepted keys are kept ``ISALIS_API_KEY_CACHE_TTL`` seconds, rejected
+        ones ``ISALIS_API_KEY_CACHE_NEGATIVE_TTL`` seconds so that probing
+        with bad keys stays cheap.
+        """
+        key = self._api_key_cache_key(*args, **kwargs)
+        if key is None:
+            return super().get_api_csi(*args, **kwargs)
+        self._sync_api_key_cache()
+        csi_id = api_key_cache.get(key)
+        if csi_id is not None:
+            return self.browse(csi_id)
+        csi = super().get_api_csi(*args, **kwargs)
+        if csi:
+            api_key_cache.set(key, csi.id)
+        else:
+            api_key_cache.set(key, 0, ttl=API_KEY_CACHE_NEGATIVE_TTL)
+        return csi
+
+    @api.model
+    def _api_key_cache_fields(self):
+        """Fields whose changes invalidate cached validations.
+
+        ``omc_csi_api_key_cache_fields`` (comma separated) narrows them down;
+        by default every field except the log columns counts.
+        """
+        names = (
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("omc_csi_api_key_cache_fields", "")
+        )
+        fields = {name.strip() for name in names.split(",") if name.strip()}
+        return fields or set(self._fields) - set(MAGIC_COLUMNS) - {"__last_update"}
+
+    def _invalidate_api_key_cache(self):
+        """Forget validations here now, and in every worker once committed."""
+        api_key_cache.clear()
+        cr = self.env.cr
+        if cr.postcommit.data.get("omc_csi_api_key_cache"):
+            return
+        cr.postcommit.data["omc_csi_api_key_cache"] = True
+        dbname = cr.dbname
+
+        @cr.postcommit.add
+        def signal_workers():
+            api_key_cache.clear()
+            with Registry(dbname).cursor() as signal_cr:
+                signal_cr.execute("SELECT nextval('omc_csi_api_key_cache_seq')")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self._invalidate_api_key_cache()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if self._api_key_cache_fields().intersection(vals):
+            self._invalidate_api_key_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self._invalidate_api_key_cache()
+        return res
@@ -0,0 +1,242 @@
+from odoo import models, fields, api
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_BREAKER_SETTINGS = {
+    # Share of failed or slow calls in the window that opens the breaker
+    "failure_rate": 0.5,
+    # Calls needed in the window before the failure rate is considered
+    "min_requests": 5,
+    # Calls slower than this count as failures
+    "slow_seconds": 10.0,
+    "window_seconds": 60.0,
+    # How long an open breaker defers deliveries before one probe is let through
+    "open_seconds": 60.0,
+}
+
+
+class WebhookCircuitBreaker(models.Model):
+    _name = "webhook.circuit_breaker"
+    _description = "Webhook Circuit Breaker"
+    _order = "host"
+
+    host = fields.Char(string="Host", required=True, readonly=True)
+    state = fields.Selection(
+        [
+            ("closed", "Closed"),
+            ("open", "Open"),
+            ("half_open", "Half-Open"),
+        ],
+        string="State",
+        default="closed",
+        required=True,
+        readonly=True,
+    )
+    window_started_at = fields.Datetime(string="Window Started At", readonly=True)
+    request_count = fields.Integer(string="Requests In Window", readonly=True)
+    failure_count = fields.Integer(string="Failures In Window", readonly=True)
+    slow_count = fields.Integer(string="Slow Calls In Window", readonly=True)
+    opened_at = fields.Datetime(string="Opened At", readonly=True)
+    next_probe_at = fields.Datetime(string="Next Probe At", readonly=True)
+    last_latency = fields.Float(string="Last Latency (s)", readonly=True)
+    last_error = fields.Text(string="Last Error", readonly=True)
+
+    _sql_constraints = [
+        (
+            "unique_host",
+            "unique(host)",
+            "Only one circuit breaker per host is allowed!",
+        ),
+    ]
+
+    @api.model
+    def _get_breaker_settings(self):
+        ICP = self.env["ir.config_parameter"].sudo()
+        settings = {}
+        for name, default in DEFAULT_BREAKER_SETTINGS.items():
+            value = ICP.get_param(f"webhook_breaker_{name}", default)
+            try:
+                settings[name] = float(value)
+            except ValueError:
+                settings[name] = default
+        return settings
+
+    @api.model
+    def _acquire(self, hosts):
+        """Decide how deliveries to each host may proceed right now.
+
+        Returns ``{host: (decision, retry_at)}`` where decision is "send",
+        "probe" (send a single request, defer the others) or "defer" (no
+        network I/O), and ``retry_at`` is when deferred deliveries are due
+        again. Runs on its own short transaction so the decision is
+        visible to the other workers at once, and only one of them gets the
+        probe of a half-open breaker.
+        """
+        hosts = [host for host in set(hosts) if host]
+        decisions = {host: ("send", None) for host in hosts}
+        if not hosts:
+            return decisions
+        open_for = timedelta(seconds=self._get_breaker_settings()["open_seconds"])
+        now = fields.Datetime.now()
+        with self.pool.cursor() as cr:
+            cr.execute(
+                """
+                SELECT id, host, state, next_probe_at FROM webhook_circuit_breaker
+                 WHERE host IN %s AND state != 'closed'
+                   FOR UPDATE
+                """,
+                (tuple(hosts),),
+            )
+            for breaker_id, host, state, next_probe_at in cr.fetchall():
+                if next_probe_at and next_probe_at > now:
+                    decisions[host] = ("defer", next_probe_at)
+                    continue
+                # Open and due, or a half-open probe that never reported back
+                decisions[host] = ("probe", now + open_for)
+                cr.execute(
+                    """
+                    UPDATE webhook_circuit_breaker
+                       SET state = 'half_open', next_probe_at = %s
+                     WHERE id = %s
+                    """,
+                    (decisions[host][1], breaker_id),
+                )
+        return decisions
+
+    @api.model
+    def _record_results(self, results, probes=()):
+        """Update the breakers from ``{host: [(ok, latency, error), ...]}``.
+
+        ``probes`` are the hosts whose calls were half-open probes: a
+        successful probe closes the breaker, a failed one opens it again.
+        Runs on its own short transaction, like ``_acquire``.
+        """
+        if not results:
+            return
+        settings = self._get_breaker_settings()
+        now = fields.Datetime.now()
+        window = timedelta(seconds=settings["window_seconds"])
+        open_until = now + timedelta(seconds=settings["open_seconds"])
+        with self.pool.cursor() as cr:
+            for host, calls in results.items():
+                if not host or not calls:
+                    continue
+                cr.execute(
+                    """
+                    INSERT INTO webhook_circuit_breaker
+                           (host, state, request_count, failure_count, slow_count,
+                            window_started_at, create_uid, create_date,
+                            write_uid, write_date)
+                    VALUES (%(host)s, 'closed', 0, 0, 0, %(now)s,
+                            %(uid)s, %(now)s, %(uid)s, %(now)s)
+                    ON CONFLICT (host) DO NOTHING
+                    """,
+                    {"host": host, "now": now, "uid": self.env.uid},
+                )
+                cr.execute(
+                    """
+                    SELECT state, request_count, failure_count, slow_count,
+                           window_started_at, opened_at, next_probe_at
+                      FROM webhook_circuit_breaker WHERE host = %s FOR UPDATE
+                    """,
+                    (host,),
+                )
+                (
+                    state,
+                    requests,
+                    failures,
+                    slow,
+                    window_started_at,
+                    opened_at,
+                    next_probe_at,
+                ) = cr.fetchone()
+                if not window_started_at or window_started_at < now - window:
+                    requests, failures, slow, window_started_at = 0, 0, 0, now
+                requests += len(calls)
+                failures += sum(1 for ok, _latency, _error in calls if not ok)
+                slow += sum(
+                    1
+                    for ok, latency, _error in calls
+                    if ok and latency >= settings["slow_seconds"]
+                )
+                errors = [error for ok, _latency, error in calls if not ok and error]
+                vals = {
+                    "state": state,
+                    "requests": requests,
+                    "failures": failures,
+                    "slow": slow,
+                    "window_started_at": window_started_at,
+                    "latency": calls[-1][1],
+                    "error": errors[-1] if errors else None,
+                    # Late results of an open breaker leave its schedule alone
+                    "opened_at": opened_at,
+                    "next_probe_at": next_probe_at,
+                    "now": now,
+                    "uid": self.env.uid,
+                    "host": host,
+                }
+                if host in probes:
+                    healthy = all(
+                        ok and latency < settings["slow_seconds"]
+                        for ok, latency, _error in calls
+                    )
+                    vals["state"] = "closed" if healthy else "open"
+                    if healthy:
+                        vals.update(
+                            requests=0,
+                            failures=0,
+                            slow=0,
+                            window_started_at=now,
+                            opened_at=None,
+                            next_probe_at=None,
+                        )
+                        _logger.info("Webhook circuit breaker closed for %s", host)
+                elif state == "closed":
+                    tripped = (
+                        requests >= settings["min_requests"]
+                        and (failures + slow) / requests >= settings["failure_rate"]
+                    )
+                    if tripped:
+                        vals["state"] = "open"
+                if vals["state"] == "open" and (state == "closed" or host in probes):
+                    _logger.warning(
+                        "Webhook circuit breaker opened for %s (%s/%s failed, %s slow)",
+                        host,
+                        failures,
+                        requests,
+                        slow,
+                    )
+                    vals.update(opened_at=now, next_probe_at=open_until)
+                cr.execute(
+                    """
+                    UPDATE webhook_circuit_breaker SET
+                        state = %(state)s,
+                        request_count = %(requests)s,
+                        failure_count = %(failures)s,
+                        slow_count = %(slow)s,
+                        window_started_at = %(window_started_at)s,
+                        last_latency = %(latency)s,
+                        last_error = COALESCE(%(error)s, last_error),
+                        opened_at = %(opened_at)s,
+                        next_probe_at = %(next_probe_at)s,
+                        write_uid = %(uid)s,
+                        write_date = %(now)s
+                     WHERE host = %(host)s
+                    """,
+                    vals,
+                )
+
+    def action_reset(self):
+        """Close the breakers so the next deliveries go out normally"""
+        self.write(
+            {
+                "state": "closed",
+                "request_count": 0,
+                "failure_count": 0,
+                "slow_count": 0,
+                "window_started_at": fields.Datetime.now(),
+                "next_probe_at": False,
+            }
+        )
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api
+from ..utils.delivery import host_of
 
 
 class WebhookConfig(models.Model):
@@ -20,10 +21,34 @@ class WebhookConfig(models.Model):
     webhook_url = fields.Char(string="Webhook URL", required=True)
     is_active = fields.Boolean(string="Active", default=True)
 
+    batch_enabled = fields.Boolean(
+        string="Batch Delivery",
+        help="Send pending notifications for this URL together as one JSON array. "
+        "Only applies when every active configuration of the URL enables it.",
+    )
+    batch_max_size = fields.Integer(string="Max Batch Size", default=50)
+    batch_linger_seconds = fields.Float(
+        string="Max Linger (s)",
+        default=2.0,
+        help="How long the first queued notification may wait for others.",
+    )
+
     company_id = fields.Many2one(
         "res.company", string="Company", default=lambda self: self.env.company
     )
 
+    circuit_breaker_id = fields.Many2one(
+        "webhook.circuit_breaker",
+        string="Circuit Breaker",
+        compute="_compute_circuit_breaker_id",
+    )
+    circuit_state = fields.Selection(
+        related="circuit_breaker_id.state", string="Circuit State"
+    )
+    circuit_opened_at = fields.Datetime(related="circuit_breaker_id.opened_at")
+    circuit_next_probe_at = fields.Datetime(related="circuit_breaker_id.next_probe_at")
+    circuit_last_error = fields.Text(related="circuit_breaker_id.last_error")
+
     _sql_constraints = [
         (
             "unique_notification_type",
@@ -32,6 +57,49 @@ class WebhookConfig(models.Model):
         )
     ]
 
+    @api.depends("webhook_url")
+    def _compute_circuit_breaker_id(self):
+        hosts = {config.id: host_of(config.webhook_url) for config in self}
+        breakers = (
+            self.env["webhook.circuit_breaker"]
+            .sudo()
+            .search([("host", "in", list(set(hosts.values())))])
+        )
+        by_host = {breaker.host: breaker.id for breaker in breakers}
+        for config in self:
+            config.circuit_breaker_id = by_host.get(hosts[config.id], False)
+
+    @api.model
+    def _get_batch_configs(self, urls=None):
+        """Return ``{webhook_url: configs}`` of the URLs sent in batch mode.
+
+        A URL is only batched when all of its active configurations enable
+        batch mode, so subscribers expecting single-object bodies never get
+        an array. Use ``_batch_limits`` for the size and linger that apply.
+        """
+        domain = [("is_active", "=", True)]
+        if urls is not None:
+            domain.append(("webhook_url", "in", [url for url in urls if url]))
+        by_url = {}
+        for config in self.search(domain):
+            by_url[config.webhook_url] = by_url.get(config.webhook_url, self) | config
+        return {
+            url: configs
+            for url, configs in by_url.items()
+            if all(configs.mapped("batch_enabled"))
+        }
+
+    def _batch_limits(self):
+        """Return ``(max size, linger seconds)``, the strictest of ``self``."""
+        return (
+            max(min(self.mapped("batch_max_size")), 1),
+            min(self.mapped("batch_linger_seconds")),
+        )
+
+    def action_reset_circuit_breaker(self):
+        """Close the circuit breaker of this webhook's host"""
+        self.circuit_breaker_id.sudo().action_reset()
+
     @api.model
     def get_webhook_url(self, event_type):
         """Get webhook URL for a specific notification type"""
@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from datetime import timedelta
+import functools
 import json
-import requests
 import logging
+import os
+import time
+from ..utils import delivery, http_client
 
 
 def check_value(val, is_bool=False):
@@ -14,6 +18,8 @@ def check_value(val, is_bool=False):
 
 _logger = logging.getLogger(__name__)
 
+WEBHOOK_TIMEOUT = float(os.getenv("ISALIS_WEBHOOK_TIMEOUT", "30"))
+
 
 class WebhookNotificationType(models.Model):
     _name = "webhook.notification_type"
@@ -53,10 +59,12 @@ class WebhookNotification(models.Model):
         string="Status",
         default="pending",
         required=True,
+        index=True,
     )
 
     retry_count = fields.Integer(string="Retry Count", default=0)
     max_retries = fields.Integer(string="Max Retries", default=3)
+    next_attempt_at = fields.Datetime(string="Next Attempt At", readonly=True)
 
     sent_date = fields.Datetime(string="Sent Date")
     error_message = fields.Text(string="Error Message")
@@ -65,6 +73,15 @@ class WebhookNotification(models.Model):
         "res.company", string="Company", default=lambda self: self.env.company
     )
 
+    def init(self):
+        # Covers the due-retry lookup done by the dispatcher
+        tools.create_index(
+            self._cr,
+            "webhook_notification_status_next_attempt_idx",
+            self._table,
+            ["status", "next_attempt_at"],
+        )
+
     @api.depends("notification_type", "model_name", "record_id")
     def _compute_name(self):
         for record in self:
@@ -72,62 +89,270 @@ class WebhookNotification(models.Model):
                 f"{record.notification_type} - {record.model_name} #{record.record_id}"
             )
 
-    def _handle_failure(self, error_message):
-        """Handle webhook failure"""
+    def _failure_vals(self, error_message, retry_after=None):
+        """Values recording a failed delivery attempt"""
         if self.retry_count < self.max_retries:
-            self.write(
-                {
-                    "status": "retry",
-                    "retry_count": self.retry_count + 1,
-                    "error_message": error_message,
-                }
-            )
-        else:
-            self.write({"status": "failed", "error_message": error_message})
+            delay = delivery.retry_delay(self.retry_count + 1, retry_after)
+            return {
+                "status": "retry",
+                "retry_count": self.retry_count + 1,
+                "error_message": error_message,
+                "next_attempt_at": fields.Datetime.now() + timedelta(seconds=delay),
+            }
+        return {
+            "status": "failed",
+            "error_message": error_message,
+            "next_attempt_at": False,
+        }
+
+    def _handle_failure(self, error_message, retry_after=None):
+        """Handle webhook failure"""
+        self.write(self._failure_vals(error_message, retry_after))
         _logger.error(f"Webhook failed: {self.name} - {error_message}")
 
+    def _delivery_outcome(self, response, error, payload):
+        """Outcome of sending this notification alone"""
+        if error is not None:
+            return {"failure": str(error)}
+        if response.status_code in [200, 201, 202]:
+            return self._sent_vals(payload)
+        return {
+            "failure": f"HTTP {response.status_code}: {response.text}",
+            "retry_after": delivery.parse_retry_after(
+                response.headers.get("Retry-After")
+            ),
+        }
+
+    def _sent_vals(self, payload):
+        return {
+            "status": "sent",
+            "sent_date": fields.Datetime.now(),
+            "payload": json.dumps(payload, indent=2),
+            "next_attempt_at": False,
+        }
+
+    def _batch_item(self, payload):
+        """Entry of this notification in a batched payload"""
+        return {
+            "id": self.id,
+            "event_type": self.event_type,
+            "model_name": self.model_name,
+            "record_id": self.record_id,
+            "payload": payload,
+        }
+
+    def _batch_outcomes(self, response, error, payloads):
+        """Map the response to a batched POST back to each notification.
+
+        A 2xx response may acknowledge items individually with
+        ``{"results": [{"id": ..., "status": "ok" | "error", "error": ...}]}``;
+        items missing from ``results`` are failed. A 2xx response without
+        ``results`` acknowledges the whole batch.
+        """
+        if error is not None or response.status_code not in [200, 201, 202]:
+            return {
+                record.id: record._delivery_outcome(
+                    response, error, payloads[record.id]
+                )
+                for record in self
+            }
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        results = body.get("results") if isinstance(body, dict) else None
+        if not isinstance(results, list):
+            return {
+                record.id: record._sent_vals(payloads[record.id]) for record in self
+            }
+        acks = {
+            item.get("id"): item for item in results if isinstance(item, dict)
+        }
+        outcomes = {}
+        for record in self:
+            ack = acks.get(record.id)
+            if ack is None:
+                outcomes[record.id] = {
+                    "failure": "No acknowledgement in batch response"
+                }
+            elif ack.get("status", "ok") == "ok":
+                outcomes[record.id] = record._sent_vals(payloads[record.id])
+            else:
+                outcomes[record.id] = {
+                    "failure": str(ack.get("error") or ack.get("status"))
+                }
+        return outcomes
+
+    def _delivery_units(self):
+        """Split into ``(records, batched)`` units, one HTTP request each.
+
+        Notifications to a URL whose configurations all have batch mode
+        enabled are grouped into chunks of at most ``batch_max_size``.
+        """
+        batch_configs = self.env["webhook.config"].sudo()._get_batch_configs(
+            self.mapped("webhook_url")
+        )
+        units = []
+        by_url = {}
+        for record in self:
+            if record.webhook_url in batch_configs:
+                by_url.setdefault(record.webhook_url, self.browse())
+                by_url[record.webhook_url] |= record
+            else:
+                units.append((record, False))
+        for url, records in by_url.items():
+            size, _linger = batch_configs[url]._batch_limits()
+            for start in range(0, len(records), size):
+                units.append((records[start : start + size], True))
+        return units
+
     def action_send_webhook(self):
-        """Send webhook notification"""
+        """Send webhook notifications concurrently and record the results"""
+        payloads = {}
+        outcomes = {}
         for record in self:
             try:
                 # Prepare payload based on notification type
-                payload = record._prepare_payload()
-
-                # Send webhook
-                response = requests.post(
-                    record.webhook_url,
-                    json=payload,
-                    # headers=json.loads(record.headers or "{}"),
-                    timeout=30,
+                payloads[record.id] = record._prepare_payload()
+            except Exception as e:
+                outcomes[record.id] = {"failure": str(e)}
+        units = self.filtered(lambda r: r.id in payloads)._delivery_units()
+
+        Breaker = self.env["webhook.circuit_breaker"].sudo()
+        decisions = Breaker._acquire(
+            delivery.host_of(records.webhook_url) for records, _batched in units
+        )
+        tasks = []
+        probes = set()
+        deferred = set()
+        for index, (records, batched) in enumerate(units):
+            url = records[0].webhook_url
+            host = delivery.host_of(url)
+            decision, retry_at = decisions.get(host, ("send", None))
+            if decision == "defer" or (decision == "probe" and host in probes):
+                # Deferred without any network I/O; not counted as an attempt
+                for record in records:
+                    outcomes[record.id] = {
+                        "status": "retry",
+                        "error_message": f"Circuit breaker open for {host}",
+                        "next_attempt_at": retry_at,
+                    }
+                deferred.update(records.ids)
+                continue
+            if decision == "probe":
+                probes.add(host)
+            if batched:
+                body = [record._batch_item(payloads[record.id]) for record in records]
+            else:
+                body = payloads[records.id]
+            tasks.append(
+                (
+                    index,
+                    host,
+                    functools.partial(
+                        http_client.post,
+                        url,
+                        json=body,
+                        # headers=json.loads(record.headers or "{}"),
+                        timeout=WEBHOOK_TIMEOUT,
+                    ),
                 )
+            )
 
-                if response.status_code in [200, 201, 202]:
-                    record.write(
-                        {
-                            "status": "sent",
-                            "sent_date": fields.Datetime.now(),
-                            "payload": json.dumps(payload, indent=2),
-                        }
-                    )
-                    _logger.info(f"Webhook sent successfully: {record.name}")
-                else:
-                    record._handle_failure(
-                        f"HTTP {response.status_code}: {response.text}"
-                    )
+        # Network I/O only; the ORM is used again once every call is done
+        results = delivery.run_per_host(tasks)
 
-            except Exception as e:
-                record._handle_failure(str(e))
+        breaker_results = {}
+        for index, (response, error, elapsed) in results.items():
+            records, batched = units[index]
+            # Client errors mean the subscriber is up; only these trip breakers
+            if error is not None:
+                breaker_error = str(error)
+            elif response.status_code >= 500 or response.status_code == 429:
+                breaker_error = f"HTTP {response.status_code}"
+            else:
+                breaker_error = None
+            breaker_results.setdefault(
+                delivery.host_of(records[0].webhook_url), []
+            ).append((breaker_error is None, elapsed, breaker_error))
+            if batched:
+                outcomes.update(records._batch_outcomes(response, error, payloads))
+            else:
+                outcomes[records.id] = records._delivery_outcome(
+                    response, error, payloads[records.id]
+                )
+        Breaker._record_results(breaker_results, probes)
+        for record in self:
+            if record.id in deferred:
+                _logger.info(f"Webhook deferred: {record.name} - open circuit")
+            elif outcomes[record.id].get("status") == "sent":
+                _logger.info(f"Webhook sent successfully: {record.name}")
+        self._apply_delivery_outcomes(outcomes)
+
+    @api.model
+    def _apply_delivery_outcomes(self, outcomes):
+        """Write ``{id: outcome}`` delivery results with a single UPDATE.
+
+        Failures (``{"failure": message, "retry_after": seconds}``) are turned
+        into ``_failure_vals``. Values missing from an outcome keep their
+        current column value, except ``next_attempt_at`` which is cleared
+        unless a retry is scheduled.
+        """
+        if not outcomes:
+            return
+        self.flush_model()
+        rows = []
+        params = []
+        for record in self.browse(list(outcomes)):
+            vals = outcomes[record.id]
+            if "failure" in vals:
+                vals = record._failure_vals(vals["failure"], vals.get("retry_after"))
+                message = vals["error_message"]
+                _logger.error(f"Webhook failed: {record.name} - {message}")
+            rows.append(
+                "(%s::int, %s::varchar, %s::int, %s::timestamp, %s::text,"
+                " %s::text, %s::timestamp)"
+            )
+            params.extend(
+                [
+                    record.id,
+                    vals["status"],
+                    vals.get("retry_count"),
+                    vals.get("sent_date"),
+                    vals.get("error_message"),
+                    vals.get("payload"),
+                    vals.get("next_attempt_at") or None,
+                ]
+            )
+        self.env.cr.execute(
+            f"""
+            UPDATE webhook_notification AS n SET
+                status = v.status,
+                retry_count = COALESCE(v.retry_count, n.retry_count),
+                sent_date = COALESCE(v.sent_date, n.sent_date),
+                error_message = COALESCE(v.error_message, n.error_message),
+                payload = COALESCE(v.payload, n.payload),
+                next_attempt_at = v.next_attempt_at,
+                write_uid = %s,
+                write_date = now() at time zone 'UTC'
+              FROM (VALUES {", ".join(rows)})
+                AS v(id, status, retry_count, sent_date, error_message, payload,
+                     next_attempt_at)
+             WHERE n.id = v.id
+            """,
+            [self.env.uid] + params,
+        )
+        self.browse(list(outcomes)).invalidate_recordset()
 
     def _prepare_payload(self):
         """Prepare payload based on notification type"""
         pass
 
     def action_retry(self):
-        """Retry failed webhooks"""
-        for record in self:
-            if record.status in ["failed", "retry"]:
-                record.write({"status": "pending", "retry_count": 0})
-                record.action_send_webhook()
+        """Retry failed webhooks now, keeping their retry count"""
+        records = self.filtered(lambda r: r.status in ["failed", "retry"])
+        records.write({"status": "pending", "next_attempt_at": False})
+        records.action_send_webhook()
 
     @api.model
     def create_notification(
@@ -167,5 +392,140 @@ class WebhookNotification(models.Model):
         notification = self.create_notification(
             event_type, model_name, record_id, webhook_url, headers
         )
-        notification.action_send_webhook()
+        batched = webhook_url in self.env["webhook.config"].sudo()._get_batch_configs(
+            [webhook_url]
+        )
+        # Batched notifications wait for the dispatcher to coalesce them
+        if not batched and not self._is_outbox_enabled():
+            notification.action_send_webhook()
         return notification
+
+    @api.model
+    def _is_outbox_enabled(self):
+        """Whether ``send_notification`` only queues rows for the dispatcher."""
+        mode = (
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("webhook_delivery_mode", "immediate")
+        )
+        return mode == "outbox"
+
+    @api.model
+    def _claim_outbox_batch(self, batch_size, include_pending=True):
+        """Lock up to ``batch_size`` committed notifications ready to be sent.
+
+        Picks retries whose ``next_attempt_at`` is due and pending rows: those
+        of batched URLs once ``batch_max_size`` of them are queued or the
+        oldest one has waited ``batch_linger_seconds``, and the others only
+        if ``include_pending``. Rows still lingering are never locked, so they
+        hold back neither due retries nor other pending rows. Rows locked by
+        another dispatcher are skipped, so several dispatchers can run side
+        by side; the locks are held until the caller commits.
+        """
+        self.flush_model(["status", "next_attempt_at", "webhook_url"])
+        batch_configs = self.env["webhook.config"].sudo()._get_batch_configs()
+        params = {"now": fields.Datetime.now(), "limit": batch_size}
+        conditions = [
+            "(status = 'retry' AND"
+            " (next_attempt_at IS NULL OR next_attempt_at <= %(now)s))"
+        ]
+        with_clause = ""
+        if batch_configs:
+            rows = []
+            for index, (url, configs) in enumerate(batch_configs.items()):
+                max_size, linger = configs._batch_limits()
+                rows.append(
+                    f"(%(url_{index})s::varchar, %(size_{index})s::int,"
+                    f" %(linger_{index})s::float)"
+                )
+                params.update(
+                    {
+                        f"url_{index}": url,
+                        f"size_{index}": max_size,
+                        f"linger_{index}": linger,
+                    }
+                )
+            with_clause = f"""
+                WITH batch(url, max_size, linger) AS (VALUES {", ".join(rows)}),
+                ready(url) AS (
+                    SELECT batch.url
+                      FROM batch
+                      JOIN webhook_notification queued
+                        ON queued.webhook_url = batch.url
+                       AND queued.status = 'pending'
+                     GROUP BY batch.url, batch.max_size, batch.linger
+                    HAVING count(*) >= batch.max_size
+                        OR min(queued.create_date)
+                           <= %(now)s - batch.linger * interval '1 second'
+                )
+            """
+            conditions.append(
+                "(status = 'pending' AND webhook_url IN (SELECT url FROM ready))"
+            )
+            if include_pending:
+                conditions.append(
+                    "(status = 'pending' AND (webhook_url IS NULL"
+                    " OR webhook_url NOT IN (SELECT url FROM batch)))"
+                )
+        elif include_pending:
+            conditions.append("status = 'pending'")
+        self.env.cr.execute(
+            f"""
+            {with_clause}
+            SELECT id FROM webhook_notification
+             WHERE {" OR ".join(conditions)}
+             ORDER BY id
+             LIMIT %(limit)s
+             FOR UPDATE SKIP LOCKED
+            """,
+            params,
+        )
+        return self.browse([row[0] for row in self.env.cr.fetchall()])
+
+    @api.model
+    def _dispatch_outbox(self, batch_size=100, max_batches=10):
+        """Send queued notifications, committing after every batch.
+
+        Due retries are always sent; pending rows only in outbox mode or for
+        batched URLs, as they are otherwise sent by ``send_notification``.
+
+        Delivery is at least once: a webhook sent just before a failed commit
+        is sent again by the next dispatcher. Returns the number of rows
+        processed.
+        """
+        processed = 0
+        include_pending = self._is_outbox_enabled()
+        for _batch in range(max_batches):
+            notifications = self._claim_outbox_batch(batch_size, include_pending)
+            if not notifications:
+                break
+            notifications.action_send_webhook()
+            self.env.cr.commit()
+            processed += len(notifications)
+            if len(notifications) < batch_size:
+                break
+        return processed
+
+    @api.model
+    def _cron_dispatch_outbox(self):
+        return self._dispatch_outbox()
+
+    @api.model
+    def run_outbox_dispatcher(self, poll_interval=5, batch_size=100, max_runtime=None):
+        """Dispatch the outbox in a loop, e.g. from ``odoo-bin shell``.
+
+        Polls every ``poll_interval`` seconds while the outbox is empty and
+        stops after ``max_runtime`` seconds (never when None).
+        """
+        started = time.monotonic()
+        while max_runtime is None or time.monotonic() - started < max_runtime:
+            try:
+                processed = self._dispatch_outbox(batch_size=batch_size)
+            except Exception:
+                _logger.exception("Webhook outbox dispatch failed")
+                self.env.cr.rollback()
+                self.env.invalidate_all()
+                processed = 0
+            if not processed:
+                self.env.cr.commit()
+                time.sleep(poll_interval)
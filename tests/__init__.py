@@ -0,0 +1,4 @@
+from . import test_helpers
+from . import test_json_codec
+from . import test_jwks
+from . import test_webhook_notification
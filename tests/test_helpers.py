@@ -0,0 +1,48 @@
+import io
+from types import SimpleNamespace
+
+from odoo.tests.common import BaseCase, tagged
+
+from odoo.addons.isalis_api_config.utils.helpers import _read_bounded, redact_body
+
+KEYS = ("password", "token")
+
+
+@tagged("post_install", "-at_install")
+class TestRedactBody(BaseCase):
+    def test_scalar_values(self):
+        self.assertEqual(
+            redact_body('{"password": "a\\"b", "token": 12, "name": "x"}', KEYS),
+            '{"password": "***", "token": "***", "name": "x"}',
+        )
+
+    def test_object_and_array_values(self):
+        body = '{"password": {"nested": "v"}, "token": ["]", 1], "a": 1}'
+        self.assertEqual(
+            redact_body(body, KEYS), '{"password": "***", "token": "***", "a": 1}'
+        )
+
+    def test_truncated_value(self):
+        self.assertEqual(
+            redact_body('{"a": 1, "password": {"nested": "v', KEYS),
+            '{"a": 1, "password": "***"',
+        )
+
+    def test_urlencoded(self):
+        self.assertEqual(
+            redact_body("password=x&token=y&name=z", KEYS),
+            "password=***&token=***&name=z",
+        )
+
+
+@tagged("post_install", "-at_install")
+class TestReadBounded(BaseCase):
+    def test_small_body_is_cached(self):
+        httprequest = SimpleNamespace(stream=io.BytesIO(b"0123"))
+        self.assertEqual(_read_bounded(httprequest, 5), b"0123")
+        self.assertEqual(httprequest._cached_data, b"0123")
+
+    def test_large_body_stays_readable(self):
+        httprequest = SimpleNamespace(stream=io.BytesIO(b"0123456789"))
+        self.assertIsNone(_read_bounded(httprequest, 5))
+        self.assertEqual(httprequest.stream.read(), b"0123456789")
@@ -0,0 +1,61 @@
+import datetime
+import random
+import struct
+import unittest
+
+from odoo.tests.common import BaseCase, tagged
+
+from odoo.addons.isalis_api_config.utils import json_codec
+
+VALUES = [
+    {"name": "Employé\u2028", "control": "\x1f", "quote": '"\\'},
+    [1, -1, 0, 2**63 - 1, -(2**63), True, False, None],
+    [1.0, -0.0, 0.1, 2.5, 1e15, 1e16, 1e22, 3.14159e-7, 1e-5, -2.5e-5, 5e-324],
+    [1.7976931348623157e308, 1.2345678901234568e17, 12345678.9],
+    [float("nan"), float("inf"), float("-inf")],
+    {1: "int", 2.5: "float", True: "bool", None: "none"},
+    {
+        "date": datetime.date(2024, 1, 2),
+        "datetime": datetime.datetime(2024, 1, 2, 3, 4, 5, 6),
+        "aware": datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc),
+        "time": datetime.time(3, 4, 5),
+    },
+    {"nested": [{"a": (1, 2)}, []], "empty": {}},
+]
+
+
+@tagged("post_install", "-at_install")
+class TestJsonCodec(BaseCase):
+    def _orjson(self, value):
+        return json_codec.orjson.dumps(
+            value, default=json_codec._default, option=json_codec._ORJSON_OPTIONS
+        )
+
+    @unittest.skipIf(json_codec.orjson is None, "orjson is not installed")
+    def test_stdlib_matches_orjson(self):
+        for value in VALUES:
+            with self.subTest(value=value):
+                self.assertEqual(json_codec._dumps_stdlib(value), self._orjson(value))
+
+    @unittest.skipIf(json_codec.orjson is None, "orjson is not installed")
+    def test_random_floats_match_orjson(self):
+        rng = random.Random(42)
+        for _index in range(20000):
+            value = struct.unpack("d", struct.pack("Q", rng.getrandbits(64)))[0]
+            self.assertEqual(json_codec._dumps_stdlib(value), self._orjson(value))
+
+    def test_stdlib_float_format(self):
+        self.assertEqual(
+            json_codec._dumps_stdlib([1e16, 3.14159e-7, float("nan"), 1.0]),
+            b"[1e16,3.14159e-7,null,1.0]",
+        )
+
+    def test_big_integers_fall_back(self):
+        self.assertEqual(json_codec.dumps([2**70]), b"[1180591620717411303424]")
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(json_codec.negotiate_encoding("gzip, deflate"), "gzip")
+        expected = "br" if json_codec.brotli is not None else "gzip"
+        self.assertEqual(json_codec.negotiate_encoding("*"), expected)
+        self.assertIsNone(json_codec.negotiate_encoding("gzip;q=0, *;q=0"))
+        self.assertIsNone(json_codec.negotiate_encoding("identity"))
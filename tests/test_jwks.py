@@ -0,0 +1,151 @@
+import json
+import os
+import tempfile
+import time
+from unittest.mock import MagicMock, patch
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from odoo.tests.common import BaseCase, tagged
+
+from odoo.addons.isalis_api_config.utils import jwks
+from odoo.addons.isalis_api_config.utils.jwks import (
+    JWKSCache,
+    UnknownKeyError,
+    verify_token,
+)
+
+ISSUER = "https://keycloak.example.com/realms/ess"
+AUDIENCE = "isalis-api"
+
+
+def _jwk(private_key, kid):
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update(kid=kid, use="sig", alg="RS256")
+    return jwk
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@tagged("post_install", "-at_install")
+class TestJWKS(BaseCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        cls.other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        cls.key_set = {"keys": [_jwk(cls.private_key, "key-1")]}
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "jwks.json")
+        self._write_key_set(self.key_set)
+        self.clock = _Clock()
+        patcher = patch.object(jwks, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write_key_set(self, key_set):
+        with open(self.path, "w") as jwks_file:
+            json.dump(key_set, jwks_file)
+
+    def _token(self, key=None, kid="key-1", **claims):
+        payload = {
+            "sub": "user-1",
+            "sid": "session-1",
+            "iss": ISSUER,
+            "aud": AUDIENCE,
+            "exp": int(time.time()) + 300,
+        }
+        payload.update(claims)
+        return jwt.encode(
+            payload, key or self.private_key, algorithm="RS256", headers={"kid": kid}
+        )
+
+    def _verify(self, token, cache=None):
+        return verify_token(token, cache or JWKSCache(path=self.path), ISSUER, AUDIENCE)
+
+    def test_valid_token(self):
+        payload = self._verify(self._token())
+        self.assertEqual(payload["sub"], "user-1")
+        self.assertEqual(payload["sid"], "session-1")
+
+    def test_wrong_issuer(self):
+        with self.assertRaises(jwt.InvalidIssuerError):
+            self._verify(self._token(iss="https://evil.example.com/realms/ess"))
+
+    def test_wrong_audience(self):
+        with self.assertRaises(jwt.InvalidAudienceError):
+            self._verify(self._token(aud="another-client"))
+
+    def test_expired_token(self):
+        with self.assertRaises(jwt.ExpiredSignatureError):
+            self._verify(self._token(exp=int(time.time()) - 60))
+
+    def test_bad_signature(self):
+        with self.assertRaises(jwt.InvalidSignatureError):
+            self._verify(self._token(key=self.other_key))
+
+    def test_issuer_and_audience_required(self):
+        with self.assertRaises(ValueError):
+            verify_token(self._token(), JWKSCache(path=self.path), ISSUER, None)
+
+    def test_unknown_kid(self):
+        with self.assertRaises(UnknownKeyError):
+            self._verify(self._token(key=self.other_key, kid="key-2"))
+
+    def test_rotated_key_is_fetched(self):
+        cache = JWKSCache(path=self.path, min_refresh_interval=30)
+        self._verify(self._token(), cache)
+        self._write_key_set(
+            {"keys": [_jwk(self.private_key, "key-1"), _jwk(self.other_key, "key-2")]}
+        )
+        token = self._token(key=self.other_key, kid="key-2")
+        # Within min_refresh_interval of the last fetch, no refetch happens
+        with self.assertRaises(UnknownKeyError):
+            self._verify(token, cache)
+        self.clock.now += 30
+        self.assertEqual(self._verify(token, cache)["sub"], "user-1")
+
+    def test_file_cache_ttl(self):
+        cache = JWKSCache(path=self.path, ttl=60)
+        with patch.object(JWKSCache, "_fetch", wraps=cache._fetch) as fetch:
+            cache.get_key("key-1")
+            self.clock.now += 59
+            cache.get_key("key-1")
+            self.assertEqual(fetch.call_count, 1)
+            self.clock.now += 2
+            cache.get_key("key-1")
+            self.assertEqual(fetch.call_count, 2)
+
+    def test_url_cache_ttl(self):
+        response = MagicMock()
+        response.json.return_value = self.key_set
+        cache = JWKSCache(url="https://keycloak.example.com/certs", ttl=60)
+        with patch.object(jwks.http_client, "get", return_value=response) as get:
+            cache.get_key("key-1")
+            self.clock.now += 59
+            cache.get_key("key-1")
+            self.assertEqual(get.call_count, 1)
+            self.clock.now += 2
+            cache.get_key("key-1")
+            self.assertEqual(get.call_count, 2)
+
+    def test_stale_keys_kept_when_fetch_fails(self):
+        cache = JWKSCache(url="https://keycloak.example.com/certs", ttl=60)
+        response = MagicMock()
+        response.json.return_value = self.key_set
+        with patch.object(jwks.http_client, "get", return_value=response):
+            cache.get_key("key-1")
+        self.clock.now += 120
+        with patch.object(jwks.http_client, "get", side_effect=OSError("down")):
+            self.assertIsNotNone(cache.get_key("key-1"))
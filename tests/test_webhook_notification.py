@@ -0,0 +1,127 @@
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from odoo import fields
+from odoo.tests.common import TransactionCase, tagged
+
+from odoo.addons.isalis_api_config.utils import http_client
+
+
+def _response(status_code, headers=None, body=None):
+    response = MagicMock(status_code=status_code, text="", headers=headers or {})
+    response.json.return_value = body
+    return response
+
+
+@tagged("post_install", "-at_install")
+class TestWebhookDelivery(TransactionCase):
+    def setUp(self):
+        super().setUp()
+        # Circuit breakers use their own cursor; keep it inside the test
+        self.registry.enter_test_mode(self.cr)
+        self.addCleanup(self.registry.leave_test_mode)
+        self.Notification = self.env["webhook.notification"]
+
+    def _create(self, url="https://hooks.example.com/ess"):
+        return self.Notification.create(
+            {"model_name": "hr.leave", "record_id": 1, "webhook_url": url}
+        )
+
+    def test_successful_send(self):
+        notification = self._create()
+        with patch.object(http_client, "post", return_value=_response(200)) as post:
+            notification.action_send_webhook()
+        post.assert_called_once()
+        self.assertEqual(notification.status, "sent")
+        self.assertTrue(notification.sent_date)
+        self.assertEqual(notification.retry_count, 0)
+        self.assertFalse(notification.next_attempt_at)
+
+    def test_failed_send_schedules_retry(self):
+        notification = self._create()
+        response = _response(503, headers={"Retry-After": "120"})
+        with patch.object(http_client, "post", return_value=response):
+            notification.action_send_webhook()
+        self.assertEqual(notification.status, "retry")
+        self.assertEqual(notification.retry_count, 1)
+        self.assertGreaterEqual(
+            notification.next_attempt_at,
+            fields.Datetime.now() + timedelta(seconds=110),
+        )
+
+    def test_mixed_results_in_one_batch(self):
+        sent = self._create("https://a.example.com/hook")
+        failed = self._create("https://b.example.com/hook")
+        failed.retry_count = failed.max_retries
+        failed.flush_recordset()
+
+        def post(url, **kwargs):
+            return _response(200 if "a.example.com" in url else 400)
+
+        execute = self.env.cr.execute
+        with patch.object(http_client, "post", side_effect=post), patch.object(
+            self.env.cr, "execute", wraps=execute
+        ) as spy:
+            (sent | failed).action_send_webhook()
+        updates = [
+            call
+            for call in spy.call_args_list
+            if "UPDATE webhook_notification" in str(call.args[0])
+        ]
+        # Both outcomes are written by one statement
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(sent.status, "sent")
+        self.assertEqual(failed.status, "failed")
+        self.assertEqual(failed.error_message, "HTTP 400: ")
+
+    def _config(self, event_type, url, batch_enabled):
+        notification_type = self.env["webhook.notification_type"].create(
+            {"name": event_type, "event_type": event_type}
+        )
+        return self.env["webhook.config"].create(
+            {
+                "notification_type": notification_type.id,
+                "webhook_url": url,
+                "batch_enabled": batch_enabled,
+            }
+        )
+
+    def test_batch_mode_needs_every_config_of_the_url(self):
+        url = "https://hooks.example.com/shared"
+        self._config("test_batched_event", url, True)
+        single = self._config("test_single_event", url, False)
+        notifications = self._create(url) | self._create(url)
+        with patch.object(http_client, "post", return_value=_response(200)) as post:
+            notifications.action_send_webhook()
+        # The subscriber of test_single_event never opted in to arrays
+        self.assertEqual(post.call_count, 2)
+        for call in post.call_args_list:
+            self.assertNotIsInstance(call.kwargs["json"], list)
+
+        single.batch_enabled = True
+        notifications = self._create(url) | self._create(url)
+        with patch.object(http_client, "post", return_value=_response(200)) as post:
+            notifications.action_send_webhook()
+        post.assert_called_once()
+        self.assertEqual(len(post.call_args.kwargs["json"]), 2)
+
+    def test_lingering_rows_are_not_claimed(self):
+        url = "https://hooks.example.com/batched"
+        config = self._config("test_lingering_event", url, True)
+        config.write({"batch_max_size": 10, "batch_linger_seconds": 60})
+        lingering = self._create(url)
+        retry = self._create()
+        retry.write(
+            {
+                "status": "retry",
+                "next_attempt_at": fields.Datetime.now() - timedelta(seconds=1),
+            }
+        )
+        claimed = self.Notification._claim_outbox_batch(100, include_pending=False)
+        self.assertIn(retry, claimed)
+        self.assertNotIn(lingering, claimed)
+
+        # A full batch no longer waits for the linger time
+        config.batch_max_size = 1
+        claimed = self.Notification._claim_outbox_batch(100, include_pending=False)
+        self.assertIn(lingering, claimed)
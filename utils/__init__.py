@@ -1 +1,12 @@
+from . import delivery
 from . import helpers
+from . import http_client
+from . import json_codec
+from . import jwks
+from . import log_sink
+from . import rate_limit
+from . import revocation
+from . import signing_keys
+from . import ttl_cache
+from . import upstream
+from . import write_behind
@@ -0,0 +1,120 @@
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+_logger = logging.getLogger(__name__)
+
+DELIVERY_MAX_WORKERS = int(os.getenv("ISALIS_WEBHOOK_MAX_WORKERS", "16"))
+DELIVERY_PER_HOST = int(os.getenv("ISALIS_WEBHOOK_PER_HOST", "4"))
+RETRY_BASE_DELAY = float(os.getenv("ISALIS_WEBHOOK_RETRY_BASE", "30"))
+RETRY_MAX_DELAY = float(os.getenv("ISALIS_WEBHOOK_RETRY_MAX", "3600"))
+
+_state = {"pid": None, "executor": None}
+_state_lock = threading.Lock()
+
+
+def _get_executor():
+    """Return this process' delivery pool, recreating it after a fork."""
+    pid = os.getpid()
+    if _state["pid"] != pid:
+        with _state_lock:
+            if _state["pid"] != pid:
+                _state["executor"] = ThreadPoolExecutor(
+                    max_workers=DELIVERY_MAX_WORKERS,
+                    thread_name_prefix="isalis_webhook",
+                )
+                _state["pid"] = pid
+    return _state["executor"]
+
+
+def host_of(url):
+    """Return the destination host (``host:port``) of ``url``."""
+    return urlsplit(url or "").netloc.lower()
+
+
+def retry_delay(attempt, retry_after=None):
+    """Seconds to wait before retry number ``attempt`` (1 for the first).
+
+    Exponential backoff with random jitter, capped at ``RETRY_MAX_DELAY``. A
+    ``Retry-After`` from the subscriber is honoured as a lower bound.
+    """
+    ceiling = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** max(attempt - 1, 0))
+    delay = random.uniform(RETRY_BASE_DELAY / 2, max(ceiling, RETRY_BASE_DELAY / 2))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, RETRY_MAX_DELAY))
+    return delay
+
+
+def parse_retry_after(value):
+    """Return the seconds of a ``Retry-After`` header (delay or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+def _call_timed(func):
+    started = time.monotonic()
+    try:
+        return func(), None, time.monotonic() - started
+    except Exception as e:
+        return None, e, time.monotonic() - started
+
+
+def run_per_host(tasks, per_host=None, max_in_flight=None):
+    """Run ``tasks``, an iterable of ``(key, host, func)``, on the delivery pool.
+
+    At most ``max_in_flight`` calls run at once overall and ``per_host`` per
+    host. Hosts are served round-robin, so a slow host only holds its own
+    slots and never delays tasks queued for other hosts. Returns
+    ``{key: (result, exception, elapsed seconds)}``.
+    """
+    per_host = per_host or DELIVERY_PER_HOST
+    max_in_flight = min(max_in_flight or DELIVERY_MAX_WORKERS, DELIVERY_MAX_WORKERS)
+    executor = _get_executor()
+    waiting = OrderedDict()
+    for key, host, func in tasks:
+        waiting.setdefault(host, deque()).append((key, func))
+    running = Counter()
+    in_flight = {}
+    results = {}
+
+    def fill():
+        progressed = True
+        while progressed and len(in_flight) < max_in_flight:
+            progressed = False
+            for host in list(waiting):
+                if len(in_flight) >= max_in_flight:
+                    break
+                if running[host] >= per_host:
+                    continue
+                key, func = waiting[host].popleft()
+                if not waiting[host]:
+                    del waiting[host]
+                in_flight[executor.submit(_call_timed, func)] = (key, host)
+                running[host] += 1
+                progressed = True
+
+    fill()
+    while in_flight:
+        done, _pending = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            key, host = in_flight.pop(future)
+            running[host] -= 1
+            results[key] = future.result()
+        fill()
+    return results
@@ -1,6 +1,11 @@
 from odoo.http import Response
+import hashlib
+import io
 import json
+import random
+import re
 from odoo.http import request
+from . import json_codec
 
 
 def validate_api_key(br=None):
@@ -14,14 +19,198 @@ def validate_api_key(br=None):
 
 
 def get_employee(identification_id):
-    emp = (
-        request.env["hr.employee"]
-        .sudo()
-        .search([("identification_id", "=", identification_id)], limit=1)
-    )
-    if not emp:
+    Employee = request.env["hr.employee"].sudo()
+    emp_id = Employee._get_employee_id_by_national_id(identification_id)
+    if not emp_id:
         return json_Response({"error": "Employee Not found"}, 404)
-    return emp
+    return Employee.browse(emp_id)
+
+
+DEFAULT_REDACT_KEYS = (
+    "password,token,jwt2_token,refresh_token,access_token,"
+    "authorization,secret,api_key,apikey"
+)
+DEFAULT_MAX_READ_BYTES = 10 * 1024 * 1024
+
+
+def _get_ilog_capture_settings(env):
+    """Return the ``ilog_*`` capture settings from the system parameters."""
+    ICP = env["ir.config_parameter"].sudo()
+    try:
+        max_bytes = int(ICP.get_param("ilog_capture_max_bytes", 4096))
+    except ValueError:
+        max_bytes = 4096
+    try:
+        # Bodies are only read into memory for logging up to this size;
+        # larger ones are logged by size alone
+        max_read_bytes = int(
+            ICP.get_param("ilog_capture_max_read_bytes", DEFAULT_MAX_READ_BYTES)
+        )
+    except ValueError:
+        max_read_bytes = DEFAULT_MAX_READ_BYTES
+    try:
+        sample_rates = json.loads(ICP.get_param("ilog_sample_rates", "{}") or "{}")
+    except ValueError:
+        sample_rates = {}
+    redact_keys = ICP.get_param("ilog_redact_keys", DEFAULT_REDACT_KEYS) or ""
+    return {
+        "mode": ICP.get_param("ilog_capture_mode", "bounded"),
+        "max_bytes": max_bytes,
+        "max_read_bytes": max_read_bytes,
+        "sample_rates": sample_rates if isinstance(sample_rates, dict) else {},
+        "redact_keys": tuple(k.strip() for k in redact_keys.split(",") if k.strip()),
+    }
+
+
+def _get_sample_rate(path, sample_rates):
+    """Return the sample rate of the longest route prefix matching ``path``."""
+    prefixes = [prefix for prefix in sample_rates if path.startswith(prefix)]
+    if not prefixes:
+        return 1.0
+    try:
+        return float(sample_rates[max(prefixes, key=len)])
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def _json_value_end(text, start):
+    """Return the index just past the JSON value starting at ``text[start]``.
+
+    Strings, objects and arrays are skipped whole, brackets inside strings
+    included. A value cut off by truncation runs to the end of ``text``.
+    """
+    depth = 0
+    in_string = False
+    index = start
+    while index < len(text):
+        char = text[index]
+        if in_string:
+            if char == "\\":
+                index += 1
+            elif char == '"':
+                in_string = False
+                if not depth:
+                    return index + 1
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            if not depth:
+                return index
+            depth -= 1
+            if not depth:
+                return index + 1
+        elif not depth and (char == "," or char.isspace()):
+            return index
+        index += 1
+    return len(text)
+
+
+def redact_body(text, keys):
+    """Mask the values of ``keys`` in a JSON or urlencoded body snippet.
+
+    JSON values are replaced whole, objects and arrays included.
+    """
+    if not keys:
+        return text
+    names = "|".join(re.escape(key) for key in keys)
+    parts = []
+    position = 0
+    for match in re.finditer(rf'"(?:{names})"\s*:\s*', text, flags=re.IGNORECASE):
+        if match.start() < position:
+            # A key inside a value that is already masked
+            continue
+        parts += [text[position : match.end()], '"***"']
+        position = _json_value_end(text, match.end())
+    text = "".join(parts) + text[position:]
+    return re.sub(rf"((?:^|&)(?:{names})=)[^&]*", r"\1***", text, flags=re.IGNORECASE)
+
+
+class _PrefixedStream(io.RawIOBase):
+    """Raw stream replaying ``prefix`` before reading the rest of ``stream``."""
+
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            size = min(len(buffer), len(self._prefix))
+            buffer[:size] = self._prefix[:size]
+            self._prefix = self._prefix[size:]
+            return size
+        data = self._stream.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+def _read_bounded(httprequest, limit):
+    """Return the request body, or None when it is larger than ``limit``.
+
+    At most ``limit + 1`` bytes are read, whether or not the request has a
+    Content-Length. A body that fits is cached so the form parser and the
+    route reuse the same bytes; otherwise the bytes read are put back in
+    front of the stream.
+    """
+    # Odoo may wrap the werkzeug request, whose attributes must be set
+    raw = getattr(httprequest, "_HTTPRequest__wrapped", httprequest)
+    cached = getattr(raw, "_cached_data", None)
+    if cached is not None:
+        return cached if len(cached) <= limit else None
+    stream = raw.stream
+    chunks = []
+    read = 0
+    while read <= limit:
+        chunk = stream.read(limit + 1 - read)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        read += len(chunk)
+    data = b"".join(chunks)
+    if len(data) <= limit:
+        raw._cached_data = data
+        return data
+    raw.__dict__["stream"] = io.BufferedReader(_PrefixedStream(data, stream))
+    return None
+
+
+def _capture_body(httprequest, settings):
+    """Return a bounded, redacted snapshot of the raw request body.
+
+    The snapshot starts with the original size and a sha256 of the body.
+    Multipart bodies are never read here (only field and file names are
+    logged), and nothing is parsed or re-encoded.
+    """
+    size = httprequest.content_length or 0
+    if random.random() >= _get_sample_rate(
+        httprequest.path, settings["sample_rates"]
+    ):
+        return f"[size={size} not sampled]"
+    content_type = (httprequest.content_type or "").lower()
+    if "multipart/form-data" in content_type:
+        files = {name: f.filename for name, f in httprequest.files.items()}
+        fields = list(httprequest.form.keys())
+        return f"[size={size}] " + json.dumps(
+            {"form_fields": fields, "uploaded_files": files}
+        )
+    max_read_bytes = settings["max_read_bytes"]
+    if size > max_read_bytes:
+        return f"[size={size} not captured]"
+
+    data = _read_bounded(httprequest, max_read_bytes)
+    if data is None:
+        # Chunked body without a Content-Length
+        return f"[size>{max_read_bytes} not captured]"
+    header = f"[size={len(data)} sha256={hashlib.sha256(data).hexdigest()}"
+    max_bytes = settings["max_bytes"]
+    if len(data) > max_bytes:
+        header += " truncated"
+    snippet = data[:max_bytes].decode("utf-8", errors="replace")
+    return f"{header}] {redact_body(snippet, settings['redact_keys'])}"
 
 
 def prepare_ilogdata(csi, request):
@@ -35,6 +224,11 @@ def prepare_ilogdata(csi, request):
 
     if _logdata["rtype"] != "GET":
         try:
+            settings = _get_ilog_capture_settings(request.env)
+            if settings["mode"] == "bounded":
+                _logdata["rdata"] = _capture_body(request.httprequest, settings)
+                return _logdata
+
             content_type = (request.httprequest.content_type or "").lower()
 
             if "application/json" in content_type:
@@ -65,9 +259,24 @@ def check_value(val, is_bool=False):
     return val if val not in [False, None] else ""
 
 
-def json_Response(string, status, content_type="application/json; charset=utf-8"):
-    return Response(
-        json.dumps(string, ensure_ascii=False),
+def _accept_encoding():
+    if not request:
+        return None
+    return request.httprequest.headers.get("Accept-Encoding")
+
+
+def json_Response(
+    string, status, content_type="application/json; charset=utf-8", headers=None
+):
+    body, encoding = json_codec.compress(json_codec.dumps(string), _accept_encoding())
+    response = Response(
+        body,
         content_type=content_type,
         status=status,
+        headers=headers,
     )
+    response.headers.add("Vary", "Accept-Encoding")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
@@ -0,0 +1,150 @@
+import http.cookiejar
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_logger = logging.getLogger(__name__)
+
+HTTP_POOL_HOSTS = int(os.getenv("ISALIS_HTTP_POOL_HOSTS", "10"))
+HTTP_POOL_SIZE = int(os.getenv("ISALIS_HTTP_POOL_SIZE", "10"))
+HTTP_POOL_BLOCK = os.getenv("ISALIS_HTTP_POOL_BLOCK", "0") == "1"
+HTTP_KEEP_ALIVE = os.getenv("ISALIS_HTTP_KEEP_ALIVE", "1") == "1"
+HTTP_CONNECT_TIMEOUT = float(os.getenv("ISALIS_HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("ISALIS_HTTP_READ_TIMEOUT", "30"))
+HTTP_RETRY_TOTAL = int(os.getenv("ISALIS_HTTP_RETRY_TOTAL", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("ISALIS_HTTP_RETRY_BACKOFF", "0.3"))
+HTTP_RETRY_STATUS = tuple(
+    int(code)
+    for code in os.getenv("ISALIS_HTTP_RETRY_STATUS", "502,503,504").split(",")
+    if code.strip()
+)
+
+_state = {"pid": None, "adapter": None}
+_state_lock = threading.Lock()
+_local = threading.local()
+
+
+def _build_adapter():
+    retry = Retry(
+        total=HTTP_RETRY_TOTAL,
+        connect=HTTP_RETRY_TOTAL,
+        read=0,
+        backoff_factor=HTTP_RETRY_BACKOFF,
+        status_forcelist=HTTP_RETRY_STATUS,
+        # Only idempotent methods are retried; a POST is never sent twice.
+        allowed_methods=frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"]),
+        raise_on_status=False,
+    )
+    return HTTPAdapter(
+        pool_connections=HTTP_POOL_HOSTS,
+        pool_maxsize=HTTP_POOL_SIZE,
+        pool_block=HTTP_POOL_BLOCK,
+        max_retries=retry,
+    )
+
+
+def _get_adapter():
+    """Return the connection pool of the current process.
+
+    Sockets must never be shared between prefork workers, so the adapter is
+    rebuilt whenever the pid changes (i.e. in the first request after fork).
+    """
+    pid = os.getpid()
+    if _state["pid"] != pid:
+        with _state_lock:
+            if _state["pid"] != pid:
+                _state["adapter"] = _build_adapter()
+                _state["pid"] = pid
+    return _state["adapter"]
+
+
+def get_session():
+    """Return a ``requests.Session`` bound to the shared per-process pool.
+
+    Sessions are thread-local but all of them mount the same adapter, so
+    connections are pooled per host across the threads of a worker. Only the
+    connections are shared: the session never keeps the cookies it receives,
+    as successive calls are made on behalf of different users.
+    """
+    adapter = _get_adapter()
+    session = getattr(_local, "session", None)
+    if session is None or _local.adapter is not adapter:
+        session = requests.Session()
+        session.cookies.set_policy(
+            http.cookiejar.DefaultCookiePolicy(allowed_domains=[])
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not HTTP_KEEP_ALIVE:
+            session.headers["Connection"] = "close"
+        _local.session = session
+        _local.adapter = adapter
+    return session
+
+
+def _timeout(timeout):
+    if timeout is None:
+        return (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+    if isinstance(timeout, (int, float)):
+        return (min(HTTP_CONNECT_TIMEOUT, timeout), timeout)
+    return timeout
+
+
+def request(method, url, timeout=None, **kwargs):
+    """Send a request through the pooled session.
+
+    A scalar ``timeout`` is used as the read timeout, the connect timeout
+    being capped by ``ISALIS_HTTP_CONNECT_TIMEOUT``.
+    """
+    return get_session().request(method, url, timeout=_timeout(timeout), **kwargs)
+
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
+
+
+def patch(url, **kwargs):
+    return request("PATCH", url, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request("DELETE", url, **kwargs)
+
+
+def get_pool_stats():
+    """Return connection reuse statistics of this worker, per host.
+
+    ``misses`` counts new connections (TCP/TLS handshakes), ``hits`` counts
+    requests served on an already open connection.
+    """
+    adapter = _state["adapter"]
+    if adapter is None or _state["pid"] != os.getpid():
+        return {}
+    stats = {}
+    pools = adapter.poolmanager.pools
+    for key in list(pools.keys()):
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        host = f"{pool.scheme}://{pool.host}:{pool.port}"
+        requests_count = pool.num_requests
+        misses = pool.num_connections
+        stats[host] = {
+            "requests": requests_count,
+            "hits": max(requests_count - misses, 0),
+            "misses": misses,
+            "idle": pool.pool.qsize() if pool.pool is not None else 0,
+        }
+    return stats
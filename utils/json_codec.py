@@ -0,0 +1,146 @@
+import datetime
+import gzip
+import json
+import logging
+import math
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_logger = logging.getLogger(__name__)
+
+JSON_COMPRESS_MIN_BYTES = int(os.getenv("ISALIS_JSON_COMPRESS_MIN_BYTES", "1024"))
+JSON_COMPRESS_LEVEL = int(os.getenv("ISALIS_JSON_COMPRESS_LEVEL", "5"))
+JSON_ENCODER = os.getenv("ISALIS_JSON_ENCODER", "auto")
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _format_float(value):
+    """Format a float the way orjson does.
+
+    The digits are the shortest round-trip ones, as in ``repr``. Exponents are
+    written without "+" or zero padding (``1e16``, ``3.14159e-7``), only
+    beyond the range orjson writes in plain decimal notation. NaN and the
+    infinities become ``null``.
+    """
+    if math.isnan(value) or math.isinf(value):
+        return "null"
+    text = float.__repr__(value)
+    sign = "-" if text.startswith("-") else ""
+    mantissa, _, exponent = text.lstrip("-").partition("e")
+    whole, _, fraction = mantissa.partition(".")
+    digits = (whole + fraction).lstrip("0")
+    exponent = int(exponent or 0) - len(fraction)
+    stripped = digits.rstrip("0")
+    exponent += len(digits) - len(stripped)
+    digits = stripped
+    if not digits:
+        return sign + "0.0"
+    point = len(digits) + exponent
+    if 0 <= exponent and point <= 16:
+        return sign + digits + "0" * exponent + ".0"
+    if 0 < point <= 16:
+        return sign + digits[:point] + "." + digits[point:]
+    if -5 < point <= 0:
+        return sign + "0." + "0" * -point + digits
+    if len(digits) == 1:
+        return f"{sign}{digits}e{point - 1}"
+    return f"{sign}{digits[0]}.{digits[1:]}e{point - 1}"
+
+
+class _Encoder(json.JSONEncoder):
+    """Compact stdlib encoder writing floats like orjson."""
+
+    def __init__(self):
+        super().__init__(ensure_ascii=False, separators=(",", ":"), default=_default)
+
+    def iterencode(self, o, _one_shot=False):
+        # The C encoder cannot format floats differently from repr
+        return json.encoder._make_iterencode(
+            {},
+            self.default,
+            json.encoder.encode_basestring,
+            self.indent,
+            _format_float,
+            self.key_separator,
+            self.item_separator,
+            self.sort_keys,
+            self.skipkeys,
+            _one_shot,
+        )(o, 0)
+
+
+def _dumps_stdlib(value):
+    return _Encoder().encode(value).encode()
+
+
+def dumps(value):
+    """Serialize ``value`` to compact UTF-8 JSON bytes.
+
+    orjson is used when installed (unless ``ISALIS_JSON_ENCODER=json``);
+    the stdlib fallback writes the same bytes, floats and NaN included.
+    Values orjson rejects, such as integers beyond 64 bits, fall back to the
+    stdlib encoder.
+    """
+    if orjson is not None and JSON_ENCODER != "json":
+        try:
+            return orjson.dumps(value, default=_default, option=_ORJSON_OPTIONS)
+        except TypeError:
+            pass
+    return _dumps_stdlib(value)
+
+
+def negotiate_encoding(accept_encoding):
+    """Return "br", "gzip" or None for an Accept-Encoding header value.
+
+    A ``*`` entry covers every coding the header does not list explicitly.
+    """
+    qualities = {}
+    for part in (accept_encoding or "").lower().split(","):
+        coding, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        quality = 1.0
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip()] = quality
+
+    def accepted(coding):
+        return qualities.get(coding, qualities.get("*", 0.0)) > 0
+
+    if brotli is not None and accepted("br"):
+        return "br"
+    if accepted("gzip"):
+        return "gzip"
+    return None
+
+
+def compress(body, accept_encoding):
+    """Return ``(body, encoding)``, compressed when large enough and accepted."""
+    if len(body) < JSON_COMPRESS_MIN_BYTES:
+        return body, None
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding == "br":
+        return brotli.compress(body, quality=JSON_COMPRESS_LEVEL), encoding
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=JSON_COMPRESS_LEVEL), encoding
+    return body, None
+
@@ -0,0 +1,108 @@
+import json
+import logging
+import threading
+import time
+
+import jwt
+
+from . import http_client
+
+_logger = logging.getLogger(__name__)
+
+
+class UnknownKeyError(Exception):
+    """The token is signed with a key id that is not in the key set."""
+
+
+class JWKSCache:
+    """Cached JSON Web Key Set of an identity provider.
+
+    Keys are fetched from ``url`` (or read from ``path``, handy for tests and
+    air-gapped setups) and kept for ``ttl`` seconds. When the TTL expires and
+    the provider cannot be reached, the stale keys stay in use. An unknown
+    ``kid`` triggers an early refresh (key rotation), at most once every
+    ``min_refresh_interval`` seconds.
+    """
+
+    def __init__(self, url=None, path=None, ttl=3600, min_refresh_interval=30):
+        self.url = url
+        self.path = path
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys = {}
+        self._fetched_at = None
+        self._last_attempt = None
+        self._lock = threading.Lock()
+
+    def _fetch(self):
+        if self.path:
+            with open(self.path, "rb") as jwks_file:
+                return json.load(jwks_file)
+        resp = http_client.get(self.url, timeout=5)
+        resp.raise_for_status()
+        return resp.json()
+
+    def refresh(self):
+        """Reload the key set; keep the current keys if the fetch fails."""
+        with self._lock:
+            self._last_attempt = time.monotonic()
+            try:
+                data = self._fetch()
+            except Exception as e:
+                _logger.warning("Could not fetch JWKS from %s: %s", self.url, e)
+                return False
+            keys = {}
+            for jwk in data.get("keys", []):
+                if jwk.get("use", "sig") != "sig" or not jwk.get("kid"):
+                    continue
+                try:
+                    keys[jwk["kid"]] = jwt.PyJWK(jwk)
+                except (jwt.PyJWKError, jwt.InvalidKeyError) as e:
+                    _logger.warning("Skipping JWK %s: %s", jwk.get("kid"), e)
+            self._keys = keys
+            self._fetched_at = self._last_attempt
+            return True
+
+    def get_key(self, kid):
+        now = time.monotonic()
+        if self._fetched_at is None or now - self._fetched_at > self.ttl:
+            if self._last_attempt is None or (
+                now - self._last_attempt >= self.min_refresh_interval
+            ):
+                self.refresh()
+        key = self._keys.get(kid)
+        if key is None and (
+            self._last_attempt is None
+            or time.monotonic() - self._last_attempt >= self.min_refresh_interval
+        ):
+            self.refresh()
+            key = self._keys.get(kid)
+        if key is None:
+            raise UnknownKeyError(kid)
+        return key
+
+
+def verify_token(token, jwks, issuer, audience, algorithms=("RS256", "ES256")):
+    """Verify an asymmetric JWT against ``jwks`` and return its claims.
+
+    The ``iss`` and ``aud`` claims are always checked, so both ``issuer`` and
+    ``audience`` are mandatory.
+
+    Raises ``UnknownKeyError`` for a key id missing from the key set and
+    ``jwt.InvalidTokenError`` (or a subclass) for any other failure.
+    """
+    if not issuer or not audience:
+        raise ValueError("Both an issuer and an audience are required")
+    header = jwt.get_unverified_header(token)
+    algorithm = header.get("alg")
+    if algorithm not in algorithms:
+        raise jwt.InvalidAlgorithmError(f"Algorithm not allowed: {algorithm}")
+    key = jwks.get_key(header.get("kid"))
+    return jwt.decode(
+        token,
+        key.key,
+        algorithms=[algorithm],
+        issuer=issuer,
+        audience=audience,
+        options={"require": ["exp", "iss", "aud"]},
+    )
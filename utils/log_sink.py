@@ -0,0 +1,50 @@
+import functools
+import logging
+import os
+
+from odoo import api, SUPERUSER_ID
+from odoo.modules.registry import Registry
+
+from .write_behind import BatchingQueue
+
+_logger = logging.getLogger(__name__)
+
+ILOG_FLUSH_BATCH = int(os.getenv("ISALIS_ILOG_FLUSH_BATCH", "200"))
+ILOG_FLUSH_SECONDS = float(os.getenv("ISALIS_ILOG_FLUSH_SECONDS", "5"))
+ILOG_MAX_QUEUE = int(os.getenv("ISALIS_ILOG_MAX_QUEUE", "10000"))
+ILOG_SAMPLE_EVERY = int(os.getenv("ISALIS_ILOG_SAMPLE_EVERY", "100"))
+
+_queues = {}
+
+
+def _flush_ilogs(dbname, batch):
+    """Insert queued ``basei.log`` rows with one multi-record create."""
+    with Registry(dbname).cursor() as cr:
+        env = api.Environment(cr, SUPERUSER_ID, {})
+        env["basei.log"].create(batch)
+
+
+def _get_queue(dbname):
+    queue = _queues.get(dbname)
+    if queue is None:
+        queue = _queues.setdefault(
+            dbname,
+            BatchingQueue(
+                functools.partial(_flush_ilogs, dbname),
+                max_batch=ILOG_FLUSH_BATCH,
+                max_age=ILOG_FLUSH_SECONDS,
+                max_queue=ILOG_MAX_QUEUE,
+                sample_every=ILOG_SAMPLE_EVERY,
+            ),
+        )
+    return queue
+
+
+def submit_ilog(env, logdata):
+    """Queue a ``basei.log`` row; it is written outside the request transaction."""
+    return _get_queue(env.cr.dbname).submit(dict(logdata))
+
+
+def get_ilog_stats():
+    """Return queue, flush latency and drop statistics per database."""
+    return {dbname: queue.stats() for dbname, queue in _queues.items()}
@@ -0,0 +1,35 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucketLimiter:
+    """In-memory token buckets, one per key.
+
+    Each bucket holds up to ``burst`` tokens and refills at ``rate`` tokens
+    per second. At most ``max_keys`` buckets are kept; the least recently
+    used ones are forgotten first (a forgotten bucket restarts full).
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, cost=1):
+        """Take ``cost`` tokens; return 0 if allowed, else seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= cost:
+                tokens -= cost
+                retry_after = 0
+            else:
+                retry_after = (cost - tokens) / self.rate if self.rate else 60
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
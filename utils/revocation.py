@@ -0,0 +1,57 @@
+import threading
+import time
+
+
+class RevocationSet:
+    """In-memory set of revoked token ids, each kept until the token expires.
+
+    Membership is a plain dictionary lookup. The owner refreshes it from the
+    database every ``sync_interval`` seconds (see ``needs_sync``) so that
+    revocations made by other workers are picked up with bounded delay.
+    """
+
+    def __init__(self, sync_interval=5):
+        self.sync_interval = sync_interval
+        self.last_sync = None
+        self._synced_at = None
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, jti):
+        expires_at = self._revoked.get(jti)
+        if expires_at is None:
+            return False
+        if expires_at <= time.time():
+            self.discard(jti)
+            return False
+        return True
+
+    def __len__(self):
+        return len(self._revoked)
+
+    def add(self, jti, expires_at):
+        if jti and expires_at > time.time():
+            with self._lock:
+                self._revoked[jti] = expires_at
+
+    def discard(self, jti):
+        with self._lock:
+            self._revoked.pop(jti, None)
+
+    def prune(self):
+        now = time.time()
+        with self._lock:
+            for jti in [jti for jti, exp in self._revoked.items() if exp <= now]:
+                del self._revoked[jti]
+
+    def needs_sync(self):
+        return (
+            self._synced_at is None
+            or time.monotonic() - self._synced_at >= self.sync_interval
+        )
+
+    def mark_synced(self, last_sync):
+        """Record a completed sync; ``last_sync`` is the owner's watermark."""
+        self.last_sync = last_sync
+        self._synced_at = time.monotonic()
+        self.prune()
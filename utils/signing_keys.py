@@ -0,0 +1,79 @@
+import hashlib
+import json
+import logging
+import secrets
+from collections import namedtuple
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+
+_logger = logging.getLogger(__name__)
+
+SIGNING_ALGORITHMS = ("HS256", "RS256", "EdDSA")
+ASYMMETRIC_ALGORITHMS = ("RS256", "EdDSA")
+
+# ``key`` signs, ``verify_key`` verifies; both are the secret for HS256.
+SigningKey = namedtuple("SigningKey", ["kid", "alg", "key", "verify_key"])
+
+
+def key_id(material):
+    """Return a stable ``kid`` derived from key material."""
+    return hashlib.sha256(material.encode()).hexdigest()[:16]
+
+
+def generate_signing_key(alg="HS256"):
+    """Return a new stored key entry for ``alg``.
+
+    HS256 keys are stored as the bare secret string (the historical format);
+    asymmetric keys as ``{"kid", "alg", "key"}`` with a PKCS#8 PEM private key.
+    """
+    if alg == "HS256":
+        return secrets.token_urlsafe(64)
+    if alg == "RS256":
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif alg == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        raise ValueError(f"Unsupported signing algorithm: {alg}")
+    pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    ).decode()
+    public_pem = (
+        private_key.public_key()
+        .public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        .decode()
+    )
+    return {"kid": key_id(public_pem), "alg": alg, "key": pem}
+
+
+def load_signing_key(entry):
+    """Return the ``SigningKey`` of a stored entry, or None if it is unusable."""
+    if isinstance(entry, str):
+        return SigningKey(key_id(entry), "HS256", entry, entry)
+    if not isinstance(entry, dict) or entry.get("alg") not in ASYMMETRIC_ALGORITHMS:
+        return None
+    try:
+        private_key = serialization.load_pem_private_key(
+            entry["key"].encode(), password=None
+        )
+    except (KeyError, ValueError, TypeError) as e:
+        _logger.warning("Skipping unreadable signing key %s: %s", entry.get("kid"), e)
+        return None
+    return SigningKey(entry["kid"], entry["alg"], private_key, private_key.public_key())
+
+
+def public_jwk(signing_key):
+    """Return the public JWK of an asymmetric ``SigningKey``."""
+    if signing_key.alg == "RS256":
+        jwk = jwt.algorithms.RSAAlgorithm.to_jwk(signing_key.verify_key)
+    else:
+        jwk = jwt.algorithms.OKPAlgorithm.to_jwk(signing_key.verify_key)
+    jwk = json.loads(jwk) if isinstance(jwk, str) else dict(jwk)
+    jwk.update({"kid": signing_key.kid, "alg": signing_key.alg, "use": "sig"})
+    return jwk
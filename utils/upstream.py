@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .ttl_cache import TTLCache
+
+_logger = logging.getLogger(__name__)
+
+UPSTREAM_DEADLINE = float(os.getenv("UPSTREAM_DEADLINE", "10"))
+UPSTREAM_MAX_WORKERS = int(os.getenv("UPSTREAM_MAX_WORKERS", "8"))
+
+UPSTREAM_CACHE_TTL = int(os.getenv("UPSTREAM_CACHE_TTL", "300"))
+UPSTREAM_CACHE_NEGATIVE_TTL = int(os.getenv("UPSTREAM_CACHE_NEGATIVE_TTL", "5"))
+UPSTREAM_CACHE_MAX_ENTRIES = int(os.getenv("UPSTREAM_CACHE_MAX_ENTRIES", "4096"))
+UPSTREAM_CACHE_MAX_BYTES = int(os.getenv("UPSTREAM_CACHE_MAX_BYTES", "8388608"))
+
+# Keycloak and user info replies, per access token digest
+upstream_cache = TTLCache(
+    max_entries=UPSTREAM_CACHE_MAX_ENTRIES,
+    max_bytes=UPSTREAM_CACHE_MAX_BYTES,
+    default_ttl=UPSTREAM_CACHE_TTL,
+    sizeof=lambda value: len(json.dumps(value, default=str)),
+)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+class UpstreamTimeout(Exception):
+    """Raised when the shared deadline of a group of upstream calls expires."""
+
+    def __init__(self, pending):
+        self.pending = sorted(pending)
+        super().__init__(f"Upstream timeout: {', '.join(self.pending)}")
+
+
+def _get_executor():
+    """Return the thread pool of the current process.
+
+    The pool is created lazily and re-created after a fork, so prefork
+    workers never inherit the (dead) threads of their parent.
+    """
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(
+                    max_workers=UPSTREAM_MAX_WORKERS,
+                    thread_name_prefix="isalis_upstream",
+                )
+                _executor_pid = pid
+    return _executor
+
+
+def _record_timing(name, elapsed, ok):
+    with _stats_lock:
+        stat = _stats.setdefault(
+            name, {"count": 0, "errors": 0, "total": 0.0, "max": 0.0, "last": 0.0}
+        )
+        stat["count"] += 1
+        stat["errors"] += 0 if ok else 1
+        stat["total"] += elapsed
+        stat["max"] = max(stat["max"], elapsed)
+        stat["last"] = elapsed
+
+
+def get_upstream_stats():
+    """Return per-call timing statistics of this worker (seconds)."""
+    with _stats_lock:
+        return {
+            name: dict(stat, avg=stat["total"] / stat["count"] if stat["count"] else 0)
+            for name, stat in _stats.items()
+        }
+
+
+def fetch_concurrently(calls, deadline=None, is_failure=None):
+    """Run upstream calls concurrently under one shared deadline.
+
+    ``calls`` maps a name to a callable receiving the remaining ``timeout`` in
+    seconds. Returns ``(results, timings)`` keyed by call name. As soon as one
+    call fails (raises, or ``is_failure(result)`` is true) the calls still
+    queued are cancelled and only the completed results are returned; calls
+    already on the wire are abandoned and their result is discarded.
+
+    Raises ``UpstreamTimeout`` when the deadline expires before every call
+    has completed.
+    """
+    deadline = UPSTREAM_DEADLINE if deadline is None else deadline
+    started = time.monotonic()
+    timings = {}
+
+    def _run(name, func):
+        call_start = time.monotonic()
+        ok = False
+        try:
+            result = func(max(deadline - (call_start - started), 0.001))
+            ok = not (is_failure and is_failure(result))
+            return result
+        finally:
+            elapsed = time.monotonic() - call_start
+            timings[name] = elapsed
+            _record_timing(name, elapsed, ok)
+            if elapsed > deadline / 2:
+                _logger.warning("Slow upstream call %s: %.3fs", name, elapsed)
+
+    executor = _get_executor()
+    futures = {executor.submit(_run, name, func): name for name, func in calls.items()}
+    results = {}
+    pending = set(futures)
+    try:
+        while pending:
+            remaining = deadline - (time.monotonic() - started)
+            if remaining <= 0:
+                raise UpstreamTimeout(futures[f] for f in pending)
+            done, pending = wait(
+                pending, timeout=remaining, return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                name = futures[future]
+                results[name] = future.result()
+                if is_failure and is_failure(results[name]):
+                    return results, timings
+        return results, timings
+    finally:
+        for future in pending:
+            future.cancel()
+        _logger.debug(
+            "Upstream calls finished in %.3fs: %s",
+            time.monotonic() - started,
+            ", ".join(f"{name}={elapsed:.3f}s" for name, elapsed in timings.items()),
+        )
@@ -0,0 +1,212 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+_logger = logging.getLogger(__name__)
+
+
+class _FlushTimer:
+    """Daemon thread calling ``self.flush()`` every ``max_age`` seconds.
+
+    The thread is started lazily, and again in each forked worker; setting
+    ``_wakeup`` makes it flush right away.
+    """
+
+    _timer_name = "isalis_write_behind"
+
+    def _init_timer(self):
+        self._timer_pid = None
+        self._timer_lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    def _ensure_timer(self):
+        pid = os.getpid()
+        if self._timer_pid == pid:
+            return
+        with self._timer_lock:
+            if self._timer_pid == pid:
+                return
+            self._timer_pid = pid
+            thread = threading.Thread(
+                target=self._run_timer, name=self._timer_name, daemon=True
+            )
+            thread.start()
+
+    def _run_timer(self):
+        pid = os.getpid()
+        while self._timer_pid == pid:
+            self._wakeup.wait(self.max_age)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                _logger.exception("Timed flush failed")
+
+
+class CoalescingBuffer(_FlushTimer):
+    """Write-behind buffer of ``key -> value`` updates.
+
+    Only the latest value per key is kept. A daemon timer thread hands the
+    pending updates to ``flush_func(dict)`` every ``max_age`` seconds, or as
+    soon as ``max_entries`` keys are pending, so callers never flush and at
+    most ``max_age`` seconds of updates are lost if the process dies.
+    """
+
+    _timer_name = "isalis_coalescing_buffer"
+
+    def __init__(self, flush_func, max_entries=500, max_age=30):
+        self.flush_func = flush_func
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._init_timer()
+        self.flushes = 0
+        self.flushed = 0
+        self.failures = 0
+        self.dropped = 0
+        self.last_flush_duration = 0.0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, key, value):
+        self._ensure_timer()
+        with self._lock:
+            self._pending[key] = value
+            full = len(self._pending) >= self.max_entries
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        started = time.monotonic()
+        try:
+            self.flush_func(batch)
+        except Exception:
+            self.failures += 1
+            _logger.exception("Write-behind flush of %s entries failed", len(batch))
+            with self._lock:
+                # Put the batch back without overwriting newer values, but
+                # never beyond max_entries so a failing sink cannot grow it
+                for key, value in batch.items():
+                    if key not in self._pending:
+                        if len(self._pending) >= self.max_entries:
+                            self.dropped += 1
+                            continue
+                        self._pending[key] = value
+            return 0
+        self.flushes += 1
+        self.flushed += len(batch)
+        self.last_flush_duration = time.monotonic() - started
+        return len(batch)
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flushed": self.flushed,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "last_flush_duration": self.last_flush_duration,
+        }
+
+
+class BatchingQueue(_FlushTimer):
+    """Bounded in-memory queue flushed in batches by ``flush_func(list)``.
+
+    A daemon timer thread flushes it every ``max_age`` seconds, or as soon
+    as ``max_batch`` items are queued, so submitting never blocks on the
+    sink. Once ``max_queue`` items are waiting, new items
+    are dropped, except one in every ``sample_every`` which replaces the
+    oldest queued item so a sample of recent traffic still gets through.
+    """
+
+    _timer_name = "isalis_batching_queue"
+
+    def __init__(
+        self,
+        flush_func,
+        max_batch=200,
+        max_age=5,
+        max_queue=10000,
+        sample_every=100,
+    ):
+        self.flush_func = flush_func
+        self.max_batch = max_batch
+        self.max_age = max_age
+        self.max_queue = max_queue
+        self.sample_every = sample_every
+        self._queue = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._init_timer()
+        self.submitted = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.sampled = 0
+        self.failures = 0
+        self.last_flush_duration = 0.0
+        self.max_flush_duration = 0.0
+
+    def __len__(self):
+        return len(self._queue)
+
+    def submit(self, item):
+        self._ensure_timer()
+        with self._lock:
+            self.submitted += 1
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                if not (self.sample_every and self.dropped % self.sample_every == 0):
+                    return False
+                self._queue.popleft()
+                self.sampled += 1
+            self._queue.append(item)
+            due = len(self._queue) >= self.max_batch
+        if due:
+            self._wakeup.set()
+        return True
+
+    def flush(self):
+        """Flush everything queued, ``max_batch`` items per ``flush_func`` call."""
+        flushed = 0
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [
+                        self._queue.popleft()
+                        for _index in range(min(self.max_batch, len(self._queue)))
+                    ]
+                if not batch:
+                    return flushed
+                started = time.monotonic()
+                try:
+                    self.flush_func(batch)
+                except Exception:
+                    self.failures += 1
+                    self.dropped += len(batch)
+                    _logger.exception("Flush of %s queued items failed", len(batch))
+                    return flushed
+                duration = time.monotonic() - started
+                self.last_flush_duration = duration
+                self.max_flush_duration = max(self.max_flush_duration, duration)
+                self.flushed += len(batch)
+                flushed += len(batch)
+
+    def stats(self):
+        return {
+            "queued": len(self._queue),
+            "submitted": self.submitted,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "sampled": self.sampled,
+            "failures": self.failures,
+            "last_flush_duration": self.last_flush_duration,
+            "max_flush_duration": self.max_flush_duration,
+        }